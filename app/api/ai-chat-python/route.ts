@@ -1,69 +1,69 @@
 import { type NextRequest, NextResponse } from "next/server"
-import { exec } from "child_process"
-import { promisify } from "util"
-import fs from "fs"
-import path from "path"
+import { getPythonWorkerPool } from "@/lib/python-worker-pool"
 
-const execAsync = promisify(exec)
+const SETUP_ERROR = "Failed to get AI response. Make sure your .env file contains GROQ_API_KEY and run: pip install groq"
 
 export async function POST(req: NextRequest) {
   try {
-    const { message, conversation_history } = await req.json()
+    const { message, conversation_history, session_id, stream } = await req.json()
+    // With a session_id the worker keeps the history and packs it to a token budget
+    const params = { message, conversation_history: conversation_history || [], session_id }
 
-    // Create a temporary file with the conversation data
-    const tempData = {
-      message,
-      conversation_history: conversation_history || [],
+    if (stream) {
+      return streamResponse(params)
     }
 
-    const tempFile = path.join(process.cwd(), "temp_chat.json")
-    fs.writeFileSync(tempFile, JSON.stringify(tempData))
-
-    // Run Python AI advisor with the message using the official Groq client
-    const command = `python -c "
-import sys
-import json
-import os
-from scripts.ai_portfolio_advisor import AIPortfolioAdvisor
-
-try:
-    # Read temp data
-    with open('temp_chat.json', 'r') as f:
-        data = json.load(f)
-
-    advisor = AIPortfolioAdvisor()
-    response = advisor.chat_with_advisor(data['message'], data['conversation_history'])
-    print(json.dumps({'response': response, 'success': True}))
-    
-except Exception as e:
-    print(json.dumps({'error': str(e), 'success': False}))
-"`
-
-    const { stdout, stderr } = await execAsync(command)
-
-    // Clean up temp file
-    if (fs.existsSync(tempFile)) {
-      fs.unlinkSync(tempFile)
-    }
-
-    if (stderr) {
-      console.error("Python stderr:", stderr)
-    }
-
-    const result = JSON.parse(stdout.trim())
-
-    if (!result.success) {
-      return NextResponse.json({ error: result.error }, { status: 500 })
-    }
+    // Run the AI advisor in a warm Python worker using the official Groq client
+    const result = await getPythonWorkerPool().call<{ response: string }>("chat", params)
 
     return NextResponse.json({ response: result.response })
   } catch (error) {
     console.error("Error running Python AI chat:", error)
-    return NextResponse.json(
-      {
-        error: "Failed to get AI response. Make sure your .env file contains GROQ_API_KEY and run: pip install groq",
-      },
-      { status: 500 },
-    )
+    return NextResponse.json({ error: SETUP_ERROR }, { status: 500 })
   }
 }
+
+// Server-sent events: one `data: {"delta": ...}` event per token chunk as the
+// worker forwards it, then `event: done` (or `event: error`). If the client
+// disconnects, the worker call is aborted and nothing more is written.
+function streamResponse(params: Record<string, unknown>) {
+  const encoder = new TextEncoder()
+  const abort = new AbortController()
+  let closed = false
+
+  const body = new ReadableStream<Uint8Array>({
+    start(controller) {
+      const send = (data: unknown, event?: string) => {
+        if (closed) return
+        controller.enqueue(encoder.encode(`${event ? `event: ${event}\n` : ""}data: ${JSON.stringify(data)}\n\n`))
+      }
+      const close = () => {
+        if (closed) return
+        closed = true
+        controller.close()
+      }
+
+      getPythonWorkerPool()
+        .call<{ response: string }>("chat_stream", params, undefined, (delta) => send({ delta }), abort.signal)
+        .then((result) => send({ response: result.response }, "done"))
+        .catch((error) => {
+          if (closed) return
+          console.error("Error streaming Python AI chat:", error)
+          send({ error: SETUP_ERROR }, "error")
+        })
+        .finally(close)
+    },
+    cancel() {
+      closed = true
+      abort.abort()
+    },
+  })
+
+  return new Response(body, {
+    headers: {
+      "Content-Type": "text/event-stream; charset=utf-8",
+      "Cache-Control": "no-cache, no-transform",
+      Connection: "keep-alive",
+    },
+  })
+}
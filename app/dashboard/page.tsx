@@ -23,6 +23,7 @@ import {
   Loader2,
 } from "lucide-react"
 import Link from "next/link"
+import { readServerSentEvents } from "@/lib/server-sent-events"
 
 export default function Dashboard() {
   const [portfolioData, setPortfolioData] = useState<any>(null)
@@ -35,6 +36,9 @@ export default function Dashboard() {
   ])
   const [message, setMessage] = useState("")
   const [isLoading, setIsLoading] = useState(false)
+  const [isStreaming, setIsStreaming] = useState(false)
+  // The server keeps the conversation for this session, so only new messages are sent
+  const [sessionId] = useState(() => crypto.randomUUID())
 
   // Load portfolio data from Python backend
   useEffect(() => {
@@ -92,17 +96,39 @@ Your portfolio shows good diversification with a balanced risk profile. How can
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
           message: message,
-          conversation_history: chatMessages.slice(-10), // Keep last 10 messages for context
+          session_id: sessionId,
+          stream: true,
         }),
       })
 
-      const data = await response.json()
-
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
+        const data = await response.json().catch(() => ({}))
         throw new Error(data.error || "Failed to get AI response")
       }
 
-      setChatMessages((prev) => [...prev, { role: "assistant", content: data.response }])
+      // Show tokens as they arrive: the first delta opens the reply, later ones extend it
+      let started = false
+      const appendToReply = (text: string) => {
+        if (!started) {
+          started = true
+          setIsStreaming(true)
+          setChatMessages((prev) => [...prev, { role: "assistant", content: text }])
+          return
+        }
+        setChatMessages((prev) => [
+          ...prev.slice(0, -1),
+          { role: "assistant", content: prev[prev.length - 1].content + text },
+        ])
+      }
+
+      await readServerSentEvents(response.body, (event, data) => {
+        if (event === "error") throw new Error(data.error || "Failed to get AI response")
+        if (event === "done") {
+          if (!started) appendToReply(data.response)
+          return
+        }
+        appendToReply(data.delta)
+      })
     } catch (error) {
       console.error("Error sending message:", error)
       setChatMessages((prev) => [
@@ -114,6 +140,7 @@ Your portfolio shows good diversification with a balanced risk profile. How can
       ])
     } finally {
       setIsLoading(false)
+      setIsStreaming(false)
     }
   }
 
@@ -367,7 +394,7 @@ Your portfolio shows good diversification with a balanced risk profile. How can
                   </div>
                 </div>
               ))}
-              {isLoading && (
+              {isLoading && !isStreaming && (
                 <div className="flex justify-start">
                   <div className="bg-slate-100 text-slate-900 p-3 rounded-lg flex items-center space-x-2">
                     <Loader2 className="w-4 h-4 animate-spin" />
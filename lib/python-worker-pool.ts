@@ -0,0 +1,269 @@
+import { spawn, type ChildProcessWithoutNullStreams } from "child_process"
+import path from "path"
+
+// Pool of long-lived `scripts/python_worker.py` processes speaking
+// length-prefixed JSON-RPC (4-byte big-endian length + UTF-8 JSON) over stdio.
+// Streaming methods send `{id, delta}` frames before their final result frame;
+// an aborted call sends `{id, cancel: true}` so the worker stops generating.
+
+const PYTHON_BIN = process.env.PYTHON_BIN || "python"
+const WORKER_SCRIPT = path.join(process.cwd(), "scripts", "python_worker.py")
+const DEFAULT_POOL_SIZE = Number(process.env.PYTHON_WORKERS || 2)
+const DEFAULT_TIMEOUT_MS = Number(process.env.PYTHON_WORKER_TIMEOUT_MS || 60_000)
+const RESTART_DELAY_MS = 500
+
+export type DeltaHandler = (delta: string) => void
+
+type PendingCall = {
+  id: number
+  resolve: (value: any) => void
+  reject: (error: Error) => void
+  onDelta?: DeltaHandler
+  timeoutMs: number
+  timer: NodeJS.Timeout
+}
+
+type QueuedCall = {
+  method: string
+  params: Record<string, unknown>
+  timeoutMs: number
+  onDelta?: DeltaHandler
+  signal?: AbortSignal
+  queueTimer: NodeJS.Timeout
+  resolve: (value: any) => void
+  reject: (error: Error) => void
+}
+
+export class PythonWorkerError extends Error {
+  constructor(
+    message: string,
+    public readonly type: string = "WorkerError",
+  ) {
+    super(message)
+    this.name = "PythonWorkerError"
+  }
+}
+
+class PythonWorker {
+  private proc: ChildProcessWithoutNullStreams
+  private buffer = Buffer.alloc(0)
+  private pending: PendingCall | null = null
+  private nextId = 1
+  ready = false
+  dead = false
+  private exited = false
+
+  constructor(
+    private readonly onReady: (worker: PythonWorker) => void,
+    private readonly onExit: (worker: PythonWorker) => void,
+  ) {
+    this.proc = spawn(PYTHON_BIN, [WORKER_SCRIPT], {
+      cwd: process.cwd(),
+      env: process.env,
+      stdio: ["pipe", "pipe", "pipe"],
+    })
+
+    this.proc.stdout.on("data", (chunk: Buffer) => this.onData(chunk))
+    this.proc.stderr.on("data", (chunk: Buffer) => console.error(`[python-worker ${this.proc.pid}]`, chunk.toString()))
+    this.proc.on("exit", (code, signal) => this.handleExit(`exited with code ${code} signal ${signal}`))
+    this.proc.on("error", (error) => this.handleExit(error.message))
+  }
+
+  get busy() {
+    return this.pending !== null
+  }
+
+  call(
+    method: string,
+    params: Record<string, unknown>,
+    timeoutMs: number,
+    onDelta?: DeltaHandler,
+    signal?: AbortSignal,
+  ): Promise<any> {
+    return new Promise((resolve, reject) => {
+      const id = this.nextId++
+      this.pending = { id, resolve, reject, onDelta, timeoutMs, timer: this.startTimer(timeoutMs) }
+      this.write({ id, method, params })
+      signal?.addEventListener("abort", () => this.cancel(id), { once: true })
+    })
+  }
+
+  // Drop further deltas of a call and ask the worker to stop it; the call
+  // still settles with the worker's final frame, which frees the worker
+  private cancel(id: number) {
+    if (this.pending?.id !== id || this.dead) return
+    this.pending.onDelta = undefined
+    this.write({ id, cancel: true })
+  }
+
+  private write(message: Record<string, unknown>) {
+    const payload = Buffer.from(JSON.stringify(message), "utf-8")
+    const header = Buffer.alloc(4)
+    header.writeUInt32BE(payload.length, 0)
+    this.proc.stdin.write(Buffer.concat([header, payload]))
+  }
+
+  private startTimer(timeoutMs: number) {
+    return setTimeout(() => {
+      // A stuck request cannot be cancelled in-process; replace the worker
+      this.fail(new PythonWorkerError(`Python worker timed out after ${timeoutMs} ms`, "Timeout"))
+      this.kill()
+    }, timeoutMs)
+  }
+
+  kill() {
+    this.dead = true
+    this.proc.kill("SIGKILL")
+  }
+
+  private onData(chunk: Buffer) {
+    this.buffer = Buffer.concat([this.buffer, chunk])
+
+    while (this.buffer.length >= 4) {
+      const length = this.buffer.readUInt32BE(0)
+      if (this.buffer.length < 4 + length) break
+
+      const message = JSON.parse(this.buffer.subarray(4, 4 + length).toString("utf-8"))
+      this.buffer = this.buffer.subarray(4 + length)
+      this.onMessage(message)
+    }
+  }
+
+  private onMessage(message: {
+    id: number | null
+    result?: any
+    delta?: string
+    error?: { type: string; message: string }
+  }) {
+    if (message.id === null) {
+      this.ready = true
+      this.onReady(this)
+      return
+    }
+
+    const pending = this.pending
+    if (!pending) return
+
+    if (message.delta !== undefined) {
+      // The timeout bounds the silence between frames of a streaming call
+      clearTimeout(pending.timer)
+      pending.timer = this.startTimer(pending.timeoutMs)
+      pending.onDelta?.(message.delta)
+      return
+    }
+
+    this.pending = null
+    clearTimeout(pending.timer)
+
+    if (message.error) {
+      pending.reject(new PythonWorkerError(message.error.message, message.error.type))
+    } else {
+      pending.resolve(message.result)
+    }
+    this.onReady(this)
+  }
+
+  private fail(error: Error) {
+    const pending = this.pending
+    this.pending = null
+    if (pending) {
+      clearTimeout(pending.timer)
+      pending.reject(error)
+    }
+  }
+
+  private handleExit(reason: string) {
+    if (this.exited) return
+    this.exited = true
+    this.dead = true
+    this.ready = false
+    this.fail(new PythonWorkerError(`Python worker ${reason}`, "WorkerCrashed"))
+    this.onExit(this)
+  }
+}
+
+export class PythonWorkerPool {
+  private workers: PythonWorker[] = []
+  private queue: QueuedCall[] = []
+
+  constructor(private readonly size: number = DEFAULT_POOL_SIZE) {
+    for (let i = 0; i < size; i++) this.startWorker()
+  }
+
+  call<T = any>(
+    method: string,
+    params: Record<string, unknown> = {},
+    timeoutMs = DEFAULT_TIMEOUT_MS,
+    onDelta?: DeltaHandler,
+    signal?: AbortSignal,
+  ): Promise<T> {
+    return new Promise((resolve, reject) => {
+      if (signal?.aborted) {
+        reject(new PythonWorkerError("Python worker call aborted", "Aborted"))
+        return
+      }
+      const queued: QueuedCall = {
+        method,
+        params,
+        timeoutMs,
+        onDelta,
+        signal,
+        resolve,
+        reject,
+        // Also bound the wait for a free worker (e.g. while all of them restart)
+        queueTimer: setTimeout(() => {
+          this.queue = this.queue.filter((call) => call !== queued)
+          reject(new PythonWorkerError(`No Python worker available within ${timeoutMs} ms`, "Timeout"))
+        }, timeoutMs),
+      }
+      // Aborted before a worker picked it up: never send it
+      signal?.addEventListener(
+        "abort",
+        () => {
+          if (!this.queue.includes(queued)) return
+          this.queue = this.queue.filter((call) => call !== queued)
+          clearTimeout(queued.queueTimer)
+          reject(new PythonWorkerError("Python worker call aborted", "Aborted"))
+        },
+        { once: true },
+      )
+      this.queue.push(queued)
+      this.dispatch()
+    })
+  }
+
+  private startWorker() {
+    const worker = new PythonWorker(
+      () => this.dispatch(),
+      (exited) => {
+        this.workers = this.workers.filter((w) => w !== exited)
+        // Crash or timeout: bring the pool back to size after a short delay
+        setTimeout(() => this.startWorker(), RESTART_DELAY_MS)
+      },
+    )
+    this.workers.push(worker)
+  }
+
+  private dispatch() {
+    for (const worker of this.workers) {
+      if (this.queue.length === 0) return
+      if (!worker.ready || worker.dead || worker.busy) continue
+
+      const next = this.queue.shift()!
+      clearTimeout(next.queueTimer)
+      worker
+        .call(next.method, next.params, next.timeoutMs, next.onDelta, next.signal)
+        .then(next.resolve, next.reject)
+    }
+  }
+}
+
+// Survive Next.js dev-mode module reloads without leaking processes
+const globalForPool = globalThis as unknown as { pythonWorkerPool?: PythonWorkerPool }
+
+export function getPythonWorkerPool(): PythonWorkerPool {
+  if (!globalForPool.pythonWorkerPool) {
+    globalForPool.pythonWorkerPool = new PythonWorkerPool()
+  }
+  return globalForPool.pythonWorkerPool
+}
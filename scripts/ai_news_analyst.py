@@ -1,15 +1,60 @@
 import os
+import re
+import sys
+import asyncio
+import hashlib
 import logging
-from newsapi import NewsApiClient
+from collections import OrderedDict
+from urllib.parse import urlsplit
 from uagents import Agent, Context, Model
-from portfolio_manager import PortfolioManager
 import json
 import aiohttp
 
+# Modules are imported through the ``scripts`` package only, as in the worker,
+# so each one is loaded once; make the package importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.headline_index import HeadlineIndex
+from scripts.llm_cache import make_key
+from scripts.llm_scheduler import BATCH, RateLimited, estimate_request_tokens, get_scheduler
+from scripts.portfolio_manager import PortfolioManager
+from scripts.portfolio_optimizer import optimize_holdings
+from scripts.rebalancer import apply_trade_plan, plan_trades, rebalance_holdings
+from scripts.risk_profiler import RiskProfiler
+
 # Replace with your NewsAPI key
 NEWS_API_KEY = os.environ.get("NEWS_API_KEY")
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 GROQ_API_URL = os.environ.get("GROQ_API_URL")
+NEWS_API_URL = "https://newsapi.org/v2/top-headlines"
+NEWS_FETCH_TIMEOUT = 10  # seconds
+SEEN_HEADLINES_CAPACITY = 1024
+# Fetch a wide feed, but only send the headlines most relevant to the holdings
+NEWS_PAGE_SIZE = 50
+RELEVANT_HEADLINES = 5
+LLM_ERROR = "Error during LLaMA model inference."
+# Clients whose allocations round to the same vector share one analysis
+ALLOCATION_STEP = 1.0  # percentage points
+MAX_CONCURRENT_ANALYSES = 4
+# Reports waiting for delivery; analyses block once this many are queued
+SEND_QUEUE_SIZE = 256
+SEND_WORKERS = 16
+
+# Cap on any single holding in the minimum variance portfolio, so it does not
+# collapse into the lowest-volatility holdings (cash and bonds)
+MAX_HOLDING_WEIGHT = 0.25
+
+# Rebalancing menu offered with each report, as (option, label). The numbers
+# the client replies with depend on whether the agent recommended an allocation
+RECOMMENDATION = "recommendation"
+MINIMUM_VARIANCE = "minimum_variance"
+COST_AWARE = "cost_aware"
+DECLINE = "decline"
+REBALANCE_OPTIONS = [
+    (RECOMMENDATION, "Based on the agent's recommendation?"),
+    (MINIMUM_VARIANCE, "Based on the minimum variance portfolio?"),
+    (COST_AWARE, "Based on mixed complexity, which factors in rebalancing costs?"),
+    (DECLINE, "Do not rebalance."),
+]
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -28,14 +73,31 @@ class UserConfirmation(Model):
     decision: str
     target_allocation: dict
     
+# One HTTP session (and connection pool) for NewsAPI and Groq, created on first use
+# inside the agent's event loop
+_http_session = None
+
+def get_http_session():
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+    return _http_session
+
 # Fetch news function
-def fetch_news():
+async def fetch_news():
+    """Top headlines as (title, url) pairs, fetched without blocking the event loop"""
     try:
-        newsapi = NewsApiClient(api_key=NEWS_API_KEY)
-        result = newsapi.get_top_headlines(language="en", page_size=5)
+        session = get_http_session()
+        async with session.get(
+            NEWS_API_URL,
+            params={"language": "en", "pageSize": NEWS_PAGE_SIZE},
+            headers={"X-Api-Key": NEWS_API_KEY or ""},
+            timeout=aiohttp.ClientTimeout(total=NEWS_FETCH_TIMEOUT)
+        ) as response:
+            result = await response.json()
 
-        if result["status"] != "ok":
-            logging.warning(f"NewsAPI returned status: {result['status']}")
+        if result.get("status") != "ok":
+            logging.warning(f"NewsAPI returned status: {result.get('status')}")
             return []
 
         articles = result.get("articles", [])
@@ -43,21 +105,170 @@ def fetch_news():
             logging.info("No articles found for the topic.")
             return []
 
-        headlines = []
-        for article in articles:
-            title = article.get("title", "No title")
-            url = article.get("url", "")
-            headlines.append(f"{title} ({url})")
-
-        return headlines
+        return [(article.get("title") or "No title", article.get("url") or "") for article in articles]
 
     except Exception as e:
         logging.error(f"Error fetching news from NewsAPI: {e}")
         return []
 
-async def analyze_headlines_async(headlines):
+class SeenHeadlines:
+    """Bounded LRU set of headlines already analyzed, keyed by a hash of the normalized title and URL"""
+
+    def __init__(self, capacity: int = SEEN_HEADLINES_CAPACITY):
+        self.capacity = capacity
+        self._keys = OrderedDict()
+
+    @staticmethod
+    def key(title: str, url: str) -> str:
+        # Case, punctuation and whitespace changes, or tracking query strings, do not make a story new
+        normalized_title = " ".join(re.sub(r"[^\w\s]", " ", title.lower()).split())
+        parts = urlsplit(url.strip().lower())
+        normalized_url = parts.netloc + parts.path.rstrip("/")
+        return hashlib.sha1(f"{normalized_title}|{normalized_url}".encode("utf-8")).hexdigest()
+
+    def unseen(self, articles):
+        """Articles not analyzed yet (does not mark them)"""
+        return [article for article in articles if self.key(*article) not in self._keys]
+
+    def mark(self, articles) -> None:
+        for article in articles:
+            key = self.key(*article)
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+        while len(self._keys) > self.capacity:
+            self._keys.popitem(last=False)
+
+def allocation_fingerprint(frame, step: float = ALLOCATION_STEP) -> str:
+    """Hash of the holdings and their allocations rounded to ``step`` percentage points"""
+    holdings = sorted(zip(frame.symbol.tolist(), frame.allocation.tolist()))
+    canonical = ";".join(f"{symbol}:{round(allocation / step)}" for symbol, allocation in holdings)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+class ClientRegistry:
+    """
+    Registered client addresses and their portfolios.
+
+    Clients are grouped by ``allocation_fingerprint``, so the news analysis
+    runs once per distinct portfolio however many clients hold it. Group keys
+    are cached per client and recomputed only after its holdings change.
+    """
+
+    def __init__(self, allocation_step: float = ALLOCATION_STEP):
+        self.allocation_step = allocation_step
+        self._portfolios = {}
+        self._keys = {}
+
+    def __len__(self) -> int:
+        return len(self._portfolios)
+
+    def register(self, address: str, portfolio_manager=None) -> PortfolioManager:
+        """Portfolio of a client, created on first registration"""
+        if address not in self._portfolios:
+            self._portfolios[address] = portfolio_manager or PortfolioManager()
+        return self._portfolios[address]
+
+    def portfolio(self, address: str):
+        """Portfolio of a registered client, or None"""
+        return self._portfolios.get(address)
+
+    def group_key(self, address: str) -> str:
+        frame = self._portfolios[address].portfolio.assets
+        cached = self._keys.get(address)
+        if cached is None or cached[:2] != (id(frame), frame.version):
+            cached = (id(frame), frame.version, allocation_fingerprint(frame, self.allocation_step))
+            self._keys[address] = cached
+        return cached[2]
+
+    def groups(self):
+        """Client addresses by group key"""
+        groups = {}
+        for address in self._portfolios:
+            groups.setdefault(self.group_key(address), []).append(address)
+        return groups
+
+class PortfolioGroup:
+    """Analysis state of one group: a member's portfolio, its headline index and the headlines already analyzed"""
+
+    def __init__(self, portfolio_manager):
+        self.portfolio_manager = None
+        self.index = None
+        self.seen = SeenHeadlines()
+        self.use(portfolio_manager)
+
+    def use(self, portfolio_manager) -> None:
+        """
+        Analyze the group through this member's portfolio. Members can leave
+        the group by rebalancing, so a current member is picked every interval
+        """
+        if portfolio_manager is not self.portfolio_manager:
+            self.portfolio_manager = portfolio_manager
+            self.index = HeadlineIndex.from_portfolio(portfolio_manager)
+
+class SendQueue:
+    """
+    Bounded queue of reports drained by a fixed pool of sender tasks.
+
+    ``put`` waits while the queue is full, so analyses that finish faster than
+    their reports can be delivered are held back instead of buffering a
+    message per client in memory.
+    """
+
+    def __init__(self, ctx: Context, maxsize: int = SEND_QUEUE_SIZE, workers: int = SEND_WORKERS):
+        self.ctx = ctx
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.workers = workers
+        self.sent = 0
+        self.failed = 0
+        self._tasks = []
+
+    async def __aenter__(self):
+        self._tasks = [asyncio.create_task(self._drain()) for _ in range(self.workers)]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def put(self, address: str, report, target_allocation: dict) -> None:
+        await self.queue.put((address, report, target_allocation))
+
+    async def _drain(self):
+        while True:
+            address, report, target_allocation = await self.queue.get()
+            try:
+                decision = await self.ctx.send(address, report)
+                await self.ctx.send(
+                    address,
+                    UserConfirmation(decision=decision, target_allocation=target_allocation)
+                )
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                self.ctx.logger.warning(f"Could not send report to {address}: {e}")
+            finally:
+                self.queue.task_done()
+
+def relevant_headlines(index, articles):
+    """
+    The RELEVANT_HEADLINES articles most relevant to the holdings of ``index``,
+    best first, and the symbols they name. Articles that touch no holding are dropped.
+    """
+    ranked = index.top_k([title for title, _ in articles], k=RELEVANT_HEADLINES)
+    symbols = sorted({symbol for _, _, matched in ranked for symbol in matched})
+    return [articles[row] for row, _, _ in ranked], symbols
+
+async def analyze_headlines_async(headlines, pm, symbols=None):
+    """
+    Ask the LLM for allocation changes given the headlines. With ``symbols``
+    only those holdings are listed individually (class and region allocations
+    are always included), so the prompt grows with the relevant news only.
+    """
     if not headlines:
         return "No headlines to analyze."
+    assets = [asset for asset in pm.portfolio.assets if symbols is None or asset.symbol in symbols]
 
     system_prompt = """
         You are a financial advisor.
@@ -96,7 +307,6 @@ async def analyze_headlines_async(headlines):
             
         target allocations: {stocks:60%, bonds:20%, crypto:10%, cash:10%}            
     """
-    pm = PortfolioManager()
         
     user_prompt = (
         "Here are the top headlines for today: " 
@@ -107,7 +317,7 @@ async def analyze_headlines_async(headlines):
         + "Region allocation: " 
         + ", ".join([key + " - " + str(value) for key, value in pm.get_geographic_allocation().items()])
         + "Asset allocation: " 
-        + ", ".join([asset.symbol + " - " + str(asset.allocation) for asset in pm.portfolio.assets])
+        + ", ".join([asset.symbol + " - " + str(asset.allocation) for asset in assets])
         + "Based on this information, which changes should I make to my portfolio?"
     )
 
@@ -126,19 +336,36 @@ async def analyze_headlines_async(headlines):
         "Content-Type": "application/json"
     }
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(GROQ_API_URL, json=request_payload, headers=headers) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    llama_response = result["choices"][0]["message"]["content"]
-                    return llama_response.strip()
-                else:
-                    print(f"Error: LLaMA API returned status {response.status}")
-                    return "Error during LLaMA model inference."
-        except Exception as e:
-            print(f"Error calling LLaMA API: {e}")
-            return "Error during LLaMA model inference."
+    session = get_http_session()
+
+    async def post():
+        async with session.post(GROQ_API_URL, json=request_payload, headers=headers) as response:
+            if response.status == 429:
+                retry_after = response.headers.get("Retry-After")
+                raise RateLimited(float(retry_after) if retry_after and retry_after.isdigit() else None)
+            if response.status == 200:
+                result = await response.json()
+                llama_response = result["choices"][0]["message"]["content"]
+                return llama_response.strip()
+            else:
+                print(f"Error: LLaMA API returned status {response.status}")
+                return LLM_ERROR
+
+    # Background work: queued behind the advisor's interactive and dashboard
+    # requests, and groups whose prompts came out identical share one call
+    try:
+        return await get_scheduler().acall(
+            post,
+            tokens=estimate_request_tokens(request_payload["messages"], request_payload["max_tokens"]),
+            priority=BATCH,
+            key=make_key(
+                request_payload["model"], request_payload["messages"],
+                request_payload["temperature"], request_payload["max_tokens"]
+            )
+        )
+    except Exception as e:
+        print(f"Error calling LLaMA API: {e}")
+        return LLM_ERROR
 
 
 def parse_analysis(analysis: str):
@@ -154,35 +381,43 @@ def parse_analysis(analysis: str):
 
 # Create the agent
 news_agent = Agent(name="news_agent")
-news_agent.my_state = {}
-client_address = None
+news_agent.my_state = {"groups": {}}
+
+# Each client's portfolio, shared by the analysis and the rebalancing handlers
+# so rebalances persist and move the client to its new group
+clients = ClientRegistry()
 
 @news_agent.on_message(model=HelloMessage)
 async def register_client(ctx: Context, sender: str, msg: HelloMessage):
-    global client_address
-    client_address = sender
-    ctx.logger.info(f"Registered new client: {client_address}")
-    await ctx.send(client_address, WelcomeMessage(text="You are registered!"))
-    
-@news_agent.on_interval(period=30)
-async def handle_news_request(ctx: Context):
-    
-    if not client_address:
-        ctx.logger.info("Please say hello!")
-        return
-        
-    ctx.logger.info("Checking financial news...")
-    headlines = fetch_news()
+    clients.register(sender)
+    ctx.logger.info(f"Registered new client: {sender} ({len(clients)} registered)")
+    await ctx.send(sender, WelcomeMessage(text="You are registered!"))
 
-    if not headlines:
-        ctx.logger.warning("No headlines found, sending empty response.")
-        return
+async def analyze_group(ctx: Context, group: PortfolioGroup, articles):
+    """Report and recommended allocation for one portfolio group, or None if there is nothing new to send"""
+    # Drop headlines that do not touch the holdings before any inference
+    articles, symbols = relevant_headlines(group.index, articles)
+    if not articles:
+        ctx.logger.info("No headlines relevant to the portfolio, skipping analysis.")
+        return None
 
-    ctx.logger.info("Sending headlines to LLaMA for analysis...")
-    analysis = await analyze_headlines_async(headlines)
+    # Only pay for inference when there is something new to analyze. A group
+    # is new when its portfolio is, so a changed portfolio is analyzed as well
+    new_articles = group.seen.unseen(articles)
+    if not new_articles:
+        ctx.logger.info("No new headlines for the portfolio, skipping analysis.")
+        return None
+
+    headlines = [f"{title} ({url})" for title, url in articles]
+    ctx.logger.info(f"Sending headlines to LLaMA for analysis ({len(new_articles)} new)...")
+    analysis = await analyze_headlines_async(headlines, group.portfolio_manager, symbols)
     
     if type(analysis) != str:
         analysis = ""
+
+    if analysis != LLM_ERROR:
+        # A failed call leaves the headlines unseen, so the next interval retries
+        group.seen.mark(articles)
     
     try:
         target_allocation = parse_analysis(analysis)
@@ -191,19 +426,12 @@ async def handle_news_request(ctx: Context):
         
     if not target_allocation:
         ctx.logger.info("LLaMA did not recommend specific allocations.")
-        rebalance_question = "\nWould you like to rebalance your portfolio..."
-        rebalance_question += "\n1. Based on the minimum variance portfolio?"
-        rebalance_question += "\n2. Based on mixed complexity, which factors in rebalancing costs?"
-        rebalance_question += "\n3. Do not rebalance."
-        rebalance_question += "\nPlease enter the number of your decision"
     else:
         ctx.logger.info("LLaMA recommends specific allocations.")
-        rebalance_question = "\nWould you like to rebalance your portfolio..."
-        rebalance_question += "\n1. Based on the agent's recommendation?"
-        rebalance_question += "\n2. Based on the minimum variance portfolio?"
-        rebalance_question += "\n3. Based on mixed complexity, which factors in rebalancing costs?"
-        rebalance_question += "\n4. Do not rebalance."
-        rebalance_question += "\nPlease enter the number of your decision"
+    rebalance_question = "\nWould you like to rebalance your portfolio..."
+    for number, (_, label) in enumerate(rebalance_menu(target_allocation), start=1):
+        rebalance_question += f"\n{number}. {label}"
+    rebalance_question += "\nPlease enter the number of your decision"
 
     # Send response with headlines and analysis
     response = "Today's news headlines " + "\n".join(headlines)
@@ -216,38 +444,114 @@ async def handle_news_request(ctx: Context):
     response += rebalance_question
     ctx.logger.info(response)
     
-    full_report = FullReport(text=response)
-    decision = await ctx.send(client_address, full_report) 
-    await ctx.send(
-        client_address, 
-        UserConfirmation(decision=decision, target_allocation=target_allocation)
-    )
+    return FullReport(text=response), target_allocation
+
+@news_agent.on_interval(period=30)
+async def handle_news_request(ctx: Context):
+    
+    if not len(clients):
+        ctx.logger.info("Please say hello!")
+        return
+        
+    ctx.logger.info("Checking financial news...")
+    articles = await fetch_news()
+
+    if not articles:
+        ctx.logger.warning("No headlines found, sending empty response.")
+        return
+
+    # State is kept for the groups that still have members only. Members are
+    # grouped by their current fingerprint, so members[0] matches the key
+    groups = clients.groups()
+    previous = news_agent.my_state["groups"]
+    states = {}
+    for key, members in groups.items():
+        representative = clients.portfolio(members[0])
+        if key in previous:
+            states[key] = previous[key]
+            states[key].use(representative)
+        else:
+            states[key] = PortfolioGroup(representative)
+    news_agent.my_state["groups"] = states
+    ctx.logger.info(f"Analyzing news for {len(clients)} clients in {len(groups)} portfolio groups...")
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+
+    async def analyze_and_send(key, members):
+        async with semaphore:
+            result = await analyze_group(ctx, states[key], articles)
+        if result is None:
+            return
+        report, target_allocation = result
+        for address in members:
+            await outbox.put(address, report, target_allocation)
+
+    async with SendQueue(ctx) as outbox:
+        await asyncio.gather(*(analyze_and_send(key, members) for key, members in groups.items()))
+    ctx.logger.info(f"Sent {outbox.sent} reports ({outbox.failed} failed).")
+
+def rebalance_menu(target_allocation: dict) -> list:
+    """Options shown to the client, in menu order (no recommendation option without an allocation)"""
+    return [(option, label) for option, label in REBALANCE_OPTIONS if target_allocation or option != RECOMMENDATION]
+
+def chosen_option(decision: str, target_allocation: dict):
+    """Option picked by a numbered reply to the menu sent with ``target_allocation``, or None"""
+    menu = rebalance_menu(target_allocation)
+    number = decision.strip().rstrip('.')
+    if not number.isdigit() or not 1 <= int(number) <= len(menu):
+        return None
+    return menu[int(number) - 1][0]
+
+def book_trade_plan(ctx: Context, pm, plan) -> None:
+    """Log a plan's trades and apply them to the client's holdings"""
+    for trade in plan["trades"]:
+        ctx.logger.info(
+            f"{trade['action'].upper()} {trade['shares']:g} {trade['symbol']} "
+            f"@ {trade['price']:,.2f} (cost ${trade['cost']:,.2f})"
+        )
+    ctx.logger.info(f"Turnover ${plan['turnover']:,.2f}, total cost ${plan['cost']:,.2f}")
+    if plan["unbooked_cash"]:
+        ctx.logger.warning(
+            f"No cash holding to book ${plan['unbooked_cash']:,.2f} of net proceeds on; "
+            f"it is not included in the portfolio's total value"
+        )
+    apply_trade_plan(pm, plan)
 
 @news_agent.on_message(model=UserConfirmation)
 async def handle_user_confirmation(ctx: Context, sender: str, msg: UserConfirmation):
-    decision = msg.decision.strip().lower()
+    option = chosen_option(msg.decision, msg.target_allocation)
 
-    if decision != "4":
+    # Only an explicit rebalancing option trades; "Do not rebalance" and
+    # replies that match no menu entry leave the holdings alone
+    if option in (RECOMMENDATION, MINIMUM_VARIANCE, COST_AWARE):
         ctx.logger.info("User confirmed rebalancing.")
 
         # Retrieve stored target allocation
-        pm = PortfolioManager()
+        pm = clients.portfolio(sender)
+        if pm is None:
+            ctx.logger.warning(f"Confirmation from unregistered client {sender}, ignoring.")
+            return
         
-        if decision == "1":
+        if option == RECOMMENDATION:
             pm.rebalance_portfolio(msg.target_allocation)
 
-        #  JPS - had to revert back to old portfolio mgr, mvo not in class
-        elif decision == "2":
-            pass
+        elif option == MINIMUM_VARIANCE:
+            # Trade each holding to its minimum variance weight
+            minimum_variance = optimize_holdings(pm, max_weight=MAX_HOLDING_WEIGHT)
+            frame = pm.portfolio.assets
+            target_weights = [minimum_variance['weights'][symbol] for symbol in frame.symbol.tolist()]
+            book_trade_plan(ctx, pm, plan_trades(frame, target_weights))
         
-        #  JPS - had to revert back to old portfolio mgr, mcp not in class
-        elif decision == "3":
-            pass
+        elif option == COST_AWARE:
+            # Fall back to the model allocation of the portfolio's risk profile
+            target_allocation = msg.target_allocation or \
+                RiskProfiler().risk_profiles[pm.portfolio.risk_profile].asset_allocation
+            book_trade_plan(ctx, pm, rebalance_holdings(pm, target_allocation))
             
         portfolio_data = pm.to_dict()    
         print(json.dumps(portfolio_data))
         
-        await ctx.send(client_address, "Proceeding with portfolio rebalancing...")        
+        await ctx.send(sender, "Proceeding with portfolio rebalancing...")        
         
         print("\nPortfolio Summary:")
         print(f"Total Value: ${portfolio_data['total_value']:,.2f}")
@@ -257,8 +561,11 @@ async def handle_user_confirmation(ctx: Context, sender: str, msg: UserConfirmat
         print(f"Portfolio Metrics: {portfolio_data['metrics']}")
         
     else:
-        ctx.logger.info("User declined to rebalance.")
-        await ctx.send(client_address, "Rebalancing canceled. Let me know if you need anything else.")
+        if option == DECLINE:
+            ctx.logger.info("User declined to rebalance.")
+        else:
+            ctx.logger.info(f"Unrecognized rebalancing decision {msg.decision!r}, not rebalancing.")
+        await ctx.send(sender, "Rebalancing canceled. Let me know if you need anything else.")
 
 if __name__ == "__main__":
     news_agent.run()
@@ -1,8 +1,13 @@
 import os
 import json
-from typing import Dict, List, Any, Optional
-from groq import Groq
+import asyncio
+from typing import AsyncIterator, Dict, Iterator, List, Any, Optional
+import httpx
+from groq import AsyncGroq, Groq
 from dotenv import load_dotenv
+from scripts.conversation_store import ConversationStore
+from scripts.llm_cache import LLMResponseCache, make_key
+from scripts.llm_scheduler import INTERACTIVE, STANDARD, estimate_request_tokens, get_scheduler
 from scripts.portfolio_manager import PortfolioManager
 
 #test
@@ -10,6 +15,17 @@ from scripts.portfolio_manager import PortfolioManager
 # Load environment variables from .env file
 load_dotenv()
 
+MODEL = "meta-llama/llama-4-maverick-17b-128e-instruct"
+MAX_CONNECTIONS = 10  # pooled HTTP connections of the async client
+REPORT_TIMEOUT = 30.0  # seconds per request in AsyncAIPortfolioAdvisor.full_report
+REPORT_CONCURRENCY = 4
+ERROR_PREFIX = "Error getting AI response"
+
+def _total_tokens(completion) -> Optional[int]:
+    """Tokens Groq reports for a completion, charged to the scheduler's token bucket"""
+    usage = getattr(completion, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
 class AIPortfolioAdvisor:
     """
     AI-powered portfolio advisor using Groq's Llama models.
@@ -18,7 +34,12 @@ class AIPortfolioAdvisor:
     based on real-time portfolio data and advanced AI reasoning.
     """
     
-    def __init__(self):
+    def __init__(self, portfolio_manager: Optional[PortfolioManager] = None):
+        """
+        Args:
+            portfolio_manager: Portfolio the prompts describe; defaults to a new
+                ``PortfolioManager``
+        """
         self.groq_api_key = os.getenv('GROQ_API_KEY')
         if not self.groq_api_key:
             raise ValueError(
@@ -26,41 +47,102 @@ class AIPortfolioAdvisor:
                 "Please check your .env file or run: poetry install && poetry shell"
             )
         
-        self.client = Groq(api_key=self.groq_api_key)
-        self.portfolio_manager = PortfolioManager()
-        
+        self.client = self._create_client()
+        self.portfolio_manager = portfolio_manager if portfolio_manager is not None else PortfolioManager()
+        # Identical non-streaming requests are answered from disk (see llm_cache)
+        self.response_cache = LLMResponseCache.from_env()
+        # Chat history of clients that send a session_id instead of the whole conversation
+        self.conversations = ConversationStore.from_env()
+        # Rate limits and priorities shared by every Groq request of this process
+        self.scheduler = get_scheduler()
+        
+    def _create_client(self):
+        return Groq(api_key=self.groq_api_key)
+    
     def _make_groq_request(
         self, 
         messages: List[Dict], 
         max_tokens: int = 1000, 
         stream: bool = False,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        priority: str = STANDARD,
+        cache: bool = True
     ) -> str:
-        """Make a request to Groq API using the official client"""
+        """
+        Make a request to Groq API using the official client, admitted by the shared scheduler.
+        
+        Identical prompts are answered from the response cache unless ``cache``
+        is False (chat replies opt out, since each turn should be sampled anew).
+        Prompts must not contain volatile values such as timestamps, or the
+        cache key differs per process and restart.
+        """
+        if stream:
+            return "".join(self._stream_groq_request(messages, max_tokens, temperature, priority))
+        
+        cache_key = make_key(MODEL, messages, temperature, max_tokens)
+        cached = self.response_cache.get(cache_key) if cache else None
+        if cached is not None:
+            return cached
+        
         try:
-            completion = self.client.chat.completions.create(
-                model="meta-llama/llama-4-maverick-17b-128e-instruct",
-                messages=messages,
-                temperature=temperature,
-                max_completion_tokens=max_tokens,
-                top_p=1,
-                stream=stream,
-                stop=None,
+            completion = self.scheduler.call(
+                lambda: self.client.chat.completions.create(
+                    model=MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    max_completion_tokens=max_tokens,
+                    top_p=1,
+                    stream=False,
+                    stop=None,
+                ),
+                tokens=estimate_request_tokens(messages, max_tokens),
+                priority=priority,
+                key=cache_key if cache else None,
+                usage=_total_tokens
             )
             
-            if stream:
-                # Handle streaming response
-                response_text = ""
-                for chunk in completion:
-                    if chunk.choices[0].delta.content:
-                        response_text += chunk.choices[0].delta.content
-                return response_text
-            else:
-                # Handle non-streaming response
-                return completion.choices[0].message.content
+            # Only successful answers are cached
+            response_text = completion.choices[0].message.content
+            if response_text and cache:
+                self.response_cache.put(cache_key, response_text)
+            return response_text
                 
         except Exception as e:
-            return f"Error getting AI response: {str(e)}"
+            return f"{ERROR_PREFIX}: {str(e)}"
+    
+    def _stream_groq_request(
+        self,
+        messages: List[Dict],
+        max_tokens: int = 1000,
+        temperature: float = 0.7,
+        priority: str = INTERACTIVE
+    ) -> Iterator[str]:
+        """Yield response deltas as Groq sends them; a failure is yielded as an error message"""
+        try:
+            completion = self.scheduler.call(
+                lambda: self.client.chat.completions.create(
+                    model=MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    max_completion_tokens=max_tokens,
+                    top_p=1,
+                    stream=True,
+                    stop=None,
+                ),
+                tokens=estimate_request_tokens(messages, max_tokens),
+                priority=priority
+            )
+            try:
+                for chunk in completion:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Also runs when the consumer stops early, releasing the connection
+                close = getattr(completion, "close", None)
+                if close is not None:
+                    close()
+        except Exception as e:
+            yield f"{ERROR_PREFIX}: {str(e)}"
     
     def get_portfolio_analysis(self, analysis_type: str = "comprehensive") -> str:
         """
@@ -72,6 +154,10 @@ class AIPortfolioAdvisor:
         Returns:
             Detailed portfolio analysis and recommendations
         """
+        return self._make_groq_request(self._portfolio_analysis_messages(analysis_type), max_tokens=1000, temperature=0.6)
+    
+    def _portfolio_analysis_messages(self, analysis_type: str) -> List[Dict]:
+        """Prompt for get_portfolio_analysis"""
         portfolio_data = self.portfolio_manager.to_dict()
         
         system_prompt = """You are an expert investment portfolio manager AI with deep expertise in:
@@ -89,7 +175,6 @@ Your role is to provide professional, actionable investment advice based on rigo
         **Client Portfolio Summary:**
         • Total Value: ${portfolio_data['total_value']:,.2f}
         • Risk Profile: {portfolio_data['risk_profile'].title()}
-        • Last Updated: {portfolio_data['last_updated']}
         • Number of Holdings: {portfolio_data['metrics']['num_assets']}
         
         **Current Asset Allocation:**
@@ -126,10 +211,14 @@ Your role is to provide professional, actionable investment advice based on rigo
             {"role": "user", "content": user_prompt}
         ]
         
-        return self._make_groq_request(messages, max_tokens=1000, temperature=0.6)
+        return messages
     
     def get_rebalancing_advice(self, target_allocation: Dict[str, float]) -> str:
         """Get AI advice on portfolio rebalancing"""
+        return self._make_groq_request(self._rebalancing_messages(target_allocation), max_tokens=600)
+    
+    def _rebalancing_messages(self, target_allocation: Dict[str, float]) -> List[Dict]:
+        """Prompt for get_rebalancing_advice"""
         rebalancing_data = self.portfolio_manager.rebalance_portfolio(target_allocation)
         
         system_prompt = """You are an expert portfolio manager AI specializing in portfolio rebalancing and optimization. Provide clear, actionable advice on portfolio adjustments based on the rebalancing analysis provided."""
@@ -154,10 +243,14 @@ Your role is to provide professional, actionable investment advice based on rigo
             {"role": "user", "content": user_prompt}
         ]
         
-        return self._make_groq_request(messages, max_tokens=600)
+        return messages
     
     def get_market_outlook(self) -> str:
         """Get AI market outlook and portfolio implications"""
+        return self._make_groq_request(self._market_outlook_messages(), max_tokens=700)
+    
+    def _market_outlook_messages(self) -> List[Dict]:
+        """Prompt for get_market_outlook"""
         portfolio_data = self.portfolio_manager.to_dict()
         
         system_prompt = """You are a senior investment strategist AI with expertise in market analysis and portfolio management. Provide market outlook and specific implications for the given portfolio based on current market conditions and trends."""
@@ -195,12 +288,13 @@ Your role is to provide professional, actionable investment advice based on rigo
             {"role": "user", "content": user_prompt}
         ]
         
-        return self._make_groq_request(messages, max_tokens=700)
+        return messages
     
     def chat_with_advisor(
         self, 
         user_message: str, 
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        session_id: Optional[str] = None
     ) -> str:
         """
         Interactive chat with AI portfolio advisor.
@@ -208,10 +302,56 @@ Your role is to provide professional, actionable investment advice based on rigo
         Args:
             user_message: User's question or request
             conversation_history: Previous conversation messages for context
+            session_id: Use (and extend) the stored history of this session
+                instead of ``conversation_history``
             
         Returns:
             AI advisor's response with portfolio-specific insights
         """
+        response = self._make_groq_request(
+            self._chat_messages(user_message, conversation_history, session_id),
+            max_tokens=500, temperature=0.7, priority=INTERACTIVE, cache=False
+        )
+        self._record_turn(session_id, user_message, response)
+        return response
+    
+    def _history_messages(
+        self,
+        conversation_history: Optional[List[Dict]],
+        keep: int,
+        session_id: Optional[str]
+    ) -> List[Dict]:
+        """Stored session context (summary + token-budgeted recent turns), or the last messages the client sent"""
+        if session_id is None:
+            return list(conversation_history[-keep:]) if conversation_history else []
+        
+        summary, recent = self.conversations.context(session_id)
+        if not summary:
+            return recent
+        return [{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}] + recent
+    
+    def _record_turn(self, session_id: Optional[str], user_message: str, response: str) -> None:
+        """Store a completed turn in the session; failed turns are not kept"""
+        if session_id is None or not response or response.startswith(ERROR_PREFIX):
+            return
+        self.conversations.append(session_id, "user", user_message)
+        self.conversations.append(session_id, "assistant", response)
+    
+    def _record_stream(self, session_id: Optional[str], user_message: str, deltas: Iterator[str]) -> Iterator[str]:
+        """Pass deltas through and store the turn once the stream completes"""
+        parts = []
+        for delta in deltas:
+            parts.append(delta)
+            yield delta
+        self._record_turn(session_id, user_message, "".join(parts))
+    
+    def _chat_messages(
+        self,
+        user_message: str,
+        conversation_history: Optional[List[Dict]],
+        session_id: Optional[str] = None
+    ) -> List[Dict]:
+        """Prompt for chat_with_advisor"""
         portfolio_data = self.portfolio_manager.to_dict()
         
         system_prompt = f"""You are a senior AI Portfolio Manager for QuantAlpha with expertise in quantitative finance and investment strategy.
@@ -241,15 +381,19 @@ Always consider the client's current allocation, risk profile, and performance m
         messages = [{"role": "system", "content": system_prompt}]
         
         # Add conversation history (keep last 6 messages for context)
-        if conversation_history:
-            messages.extend(conversation_history[-6:])
+        messages.extend(self._history_messages(conversation_history, 6, session_id))
         
         messages.append({"role": "user", "content": user_message})
         
-        return self._make_groq_request(messages, max_tokens=500, temperature=0.7)
+        return messages
     
-    def stream_chat_response(self, user_message: str, conversation_history: List[Dict] = None):
-        """Stream chat response for real-time interaction"""
+    def stream_chat_response(
+        self,
+        user_message: str,
+        conversation_history: List[Dict] = None,
+        session_id: Optional[str] = None
+    ) -> Iterator[str]:
+        """Stream chat response for real-time interaction, yielding text deltas as they arrive"""
         portfolio_data = self.portfolio_manager.to_dict()
         
         system_prompt = f"""You are an expert AI Portfolio Manager for QuantAlpha.
@@ -262,12 +406,181 @@ Provide specific, actionable investment advice. Keep responses under 200 words."
         
         messages = [{"role": "system", "content": system_prompt}]
         
-        if conversation_history:
-            messages.extend(conversation_history[-4:])
+        messages.extend(self._history_messages(conversation_history, 4, session_id))
         
         messages.append({"role": "user", "content": user_message})
         
-        return self._make_groq_request(messages, max_tokens=400, stream=True)
+        return self._record_stream(session_id, user_message, self._stream_groq_request(messages, max_tokens=400))
+
+class AsyncAIPortfolioAdvisor(AIPortfolioAdvisor):
+    """
+    asyncio version of the advisor.
+    
+    Uses ``AsyncGroq`` over one pooled HTTP client, so concurrent requests
+    reuse keep-alive connections, and shares prompts and the response cache
+    with ``AIPortfolioAdvisor``, whose public methods return awaitables here
+    (``await advisor.get_market_outlook()``; ``stream_chat_response`` returns
+    an async iterator of deltas). The advisor must be used from a
+    single event loop, since the pooled connections belong to it; call
+    ``aclose`` when done.
+    """
+    
+    def _create_client(self):
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+        )
+        return AsyncGroq(api_key=self.groq_api_key, http_client=self.http_client)
+    
+    async def aclose(self) -> None:
+        await self.http_client.aclose()
+    
+    async def _make_groq_request(
+        self,
+        messages: List[Dict],
+        max_tokens: int = 1000,
+        stream: bool = False,
+        temperature: float = 0.7,
+        priority: str = STANDARD,
+        cache: bool = True
+    ) -> str:
+        """Make a request to Groq API using the async client, admitted by the shared scheduler (see ``AIPortfolioAdvisor._make_groq_request``)"""
+        if stream:
+            return "".join([
+                delta async for delta in self._stream_groq_request(messages, max_tokens, temperature, priority)
+            ])
+        
+        cache_key = make_key(MODEL, messages, temperature, max_tokens)
+        cached = self.response_cache.get(cache_key) if cache else None
+        if cached is not None:
+            return cached
+        
+        try:
+            completion = await self.scheduler.acall(
+                lambda: self.client.chat.completions.create(
+                    model=MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    max_completion_tokens=max_tokens,
+                    top_p=1,
+                    stream=False,
+                    stop=None,
+                ),
+                tokens=estimate_request_tokens(messages, max_tokens),
+                priority=priority,
+                key=cache_key if cache else None,
+                usage=_total_tokens
+            )
+            
+            response_text = completion.choices[0].message.content
+            if response_text and cache:
+                self.response_cache.put(cache_key, response_text)
+            return response_text
+        
+        except Exception as e:
+            return f"{ERROR_PREFIX}: {str(e)}"
+    
+    async def _stream_groq_request(
+        self,
+        messages: List[Dict],
+        max_tokens: int = 1000,
+        temperature: float = 0.7,
+        priority: str = INTERACTIVE
+    ) -> AsyncIterator[str]:
+        """Yield response deltas as Groq sends them; a failure is yielded as an error message"""
+        try:
+            completion = await self.scheduler.acall(
+                lambda: self.client.chat.completions.create(
+                    model=MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    max_completion_tokens=max_tokens,
+                    top_p=1,
+                    stream=True,
+                    stop=None,
+                ),
+                tokens=estimate_request_tokens(messages, max_tokens),
+                priority=priority
+            )
+            try:
+                async for chunk in completion:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                close = getattr(completion, "close", None)
+                if close is not None:
+                    await close()
+        except Exception as e:
+            yield f"{ERROR_PREFIX}: {str(e)}"
+    
+    async def chat_with_advisor(
+        self,
+        user_message: str,
+        conversation_history: Optional[List[Dict]] = None,
+        session_id: Optional[str] = None
+    ) -> str:
+        """Async ``AIPortfolioAdvisor.chat_with_advisor``"""
+        response = await self._make_groq_request(
+            self._chat_messages(user_message, conversation_history, session_id),
+            max_tokens=500, temperature=0.7, priority=INTERACTIVE, cache=False
+        )
+        self._record_turn(session_id, user_message, response)
+        return response
+    
+    async def _record_stream(
+        self,
+        session_id: Optional[str],
+        user_message: str,
+        deltas: AsyncIterator[str]
+    ) -> AsyncIterator[str]:
+        """Pass deltas through and store the turn once the stream completes"""
+        parts = []
+        async for delta in deltas:
+            parts.append(delta)
+            yield delta
+        self._record_turn(session_id, user_message, "".join(parts))
+    
+    async def full_report(
+        self,
+        target_allocation: Optional[Dict[str, float]] = None,
+        analysis_type: str = "comprehensive",
+        timeout: float = REPORT_TIMEOUT,
+        max_concurrency: int = REPORT_CONCURRENCY
+    ) -> Dict[str, str]:
+        """
+        Portfolio analysis, market outlook and (with a target allocation)
+        rebalancing advice, requested concurrently.
+        
+        Args:
+            target_allocation: Asset class targets for the rebalancing section
+            analysis_type: Passed to the portfolio analysis prompt
+            timeout: Seconds allowed per request; a section that times out
+                holds an error message instead of failing the report
+            max_concurrency: Requests in flight at once
+            
+        Returns:
+            Section name -> response text
+        """
+        requests = {
+            "portfolio_analysis": (self._portfolio_analysis_messages(analysis_type), 1000, 0.6),
+            "market_outlook": (self._market_outlook_messages(), 700, 0.7),
+        }
+        if target_allocation:
+            requests["rebalancing_advice"] = (self._rebalancing_messages(target_allocation), 600, 0.7)
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run(messages: List[Dict], max_tokens: int, temperature: float) -> str:
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(
+                        self._make_groq_request(messages, max_tokens=max_tokens, temperature=temperature),
+                        timeout
+                    )
+                except asyncio.TimeoutError:
+                    return f"{ERROR_PREFIX}: timed out after {timeout:g} s"
+        
+        responses = await asyncio.gather(*(run(*request) for request in requests.values()))
+        return dict(zip(requests, responses))
 
 def main():
     """Main function for testing the AI advisor"""
@@ -0,0 +1,207 @@
+"""
+Server-side chat history with token-budgeted context packing.
+
+Messages are stored in SQLite per session, so the browser only sends the new
+message. ``context`` returns what fits a token budget: the most recent turns
+verbatim plus an extractive summary of everything older. When the recent
+turns outgrow the budget, the oldest of them are folded into the summary in
+one step, down to ``COMPACT_TO`` of the budget, rather than one message per
+turn; between compactions the prompt prefix (system prompt, summary, older
+kept turns) stays byte-identical, which lets upstream prompt caching apply
+and keeps input tokens per turn flat however long the conversation gets.
+Sessions that have not been used for ``ttl`` seconds are deleted together
+with their summary, so abandoned dashboard tabs do not accumulate.
+"""
+
+import os
+import re
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'conversations.sqlite3'
+)
+DEFAULT_TOKEN_BUDGET = 1200  # tokens of verbatim history sent per turn
+DEFAULT_SUMMARY_BUDGET = 300  # tokens of summary of older turns
+COMPACT_TO = 0.5  # fraction of the budget left after folding old turns
+MESSAGE_OVERHEAD = 4  # tokens of role/formatting per chat message
+SUMMARY_SENTENCE_CHARS = 200
+DEFAULT_TTL = 7 * 24 * 3600.0  # seconds since last use before a session is dropped
+BUSY_TIMEOUT = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    session_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    covered_seq INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions (accessed);
+INSERT OR IGNORE INTO sessions (session_id, accessed)
+    SELECT session_id, MAX(created) FROM messages GROUP BY session_id;
+"""
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Llama-family tokenizers (about 4 characters per token)"""
+    return (len(text) + 3) // 4 + MESSAGE_OVERHEAD
+
+
+def _first_sentence(text: str) -> str:
+    """Leading sentence of a message, whitespace-collapsed and length-capped"""
+    text = ' '.join(text.split())
+    sentence = _SENTENCE_END.split(text, maxsplit=1)[0]
+    if len(sentence) > SUMMARY_SENTENCE_CHARS:
+        sentence = sentence[:SUMMARY_SENTENCE_CHARS].rsplit(' ', 1)[0] + '...'
+    return sentence
+
+
+class ConversationStore:
+    """
+    Per-session chat history in SQLite (WAL mode, safe across worker processes).
+
+    Args:
+        path: Database file.
+        token_budget: Estimated tokens of verbatim history returned by ``context``.
+        summary_budget: Estimated tokens the rolling summary is trimmed to.
+        ttl: Seconds since a session was last used before it is deleted
+            (0 keeps sessions forever).
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        summary_budget: int = DEFAULT_SUMMARY_BUDGET,
+        ttl: float = DEFAULT_TTL
+    ):
+        self.path = path
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.ttl = ttl
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "ConversationStore":
+        """Store configured by CONVERSATION_DB_PATH, CONVERSATION_TOKEN_BUDGET and CONVERSATION_TTL"""
+        return cls(
+            path=os.getenv('CONVERSATION_DB_PATH', DEFAULT_PATH),
+            token_budget=int(os.getenv('CONVERSATION_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET)),
+            ttl=float(os.getenv('CONVERSATION_TTL', DEFAULT_TTL))
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection of the current process (connections must not cross a fork)"""
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def _touch(self, connection: sqlite3.Connection, session_id: str, now: float) -> None:
+        """Drop sessions unused for longer than the TTL, then mark this one as used"""
+        if self.ttl > 0:
+            expired = 'SELECT session_id FROM sessions WHERE accessed <= ?'
+            cutoff = (now - self.ttl,)
+            connection.execute(f'DELETE FROM messages WHERE session_id IN ({expired})', cutoff)
+            connection.execute(f'DELETE FROM summaries WHERE session_id IN ({expired})', cutoff)
+            connection.execute('DELETE FROM sessions WHERE accessed <= ?', cutoff)
+        connection.execute(
+            'INSERT OR REPLACE INTO sessions (session_id, accessed) VALUES (?, ?)', (session_id, now)
+        )
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        """Add a message at the end of a session"""
+        connection = self._connect()
+        now = time.time()
+        with connection:
+            self._touch(connection, session_id, now)
+            connection.execute(
+                'INSERT INTO messages (session_id, seq, role, content, tokens, created) '
+                'SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ?, ? FROM messages WHERE session_id = ?',
+                (session_id, role, content, estimate_tokens(content), now, session_id)
+            )
+
+    def history(self, session_id: str) -> List[Dict[str, str]]:
+        """Every stored message of a session, oldest first"""
+        rows = self._connect().execute(
+            'SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq', (session_id,)
+        ).fetchall()
+        return [{'role': role, 'content': content} for role, content in rows]
+
+    def context(self, session_id: str) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        """
+        History to send with the next turn.
+
+        Returns:
+            Tuple of (summary of older turns or None, recent messages oldest
+            first), together within about ``token_budget + summary_budget``
+            estimated tokens
+        """
+        connection = self._connect()
+        with connection:
+            self._touch(connection, session_id, time.time())
+        row = connection.execute(
+            'SELECT summary, covered_seq FROM summaries WHERE session_id = ?', (session_id,)
+        ).fetchone()
+        summary, covered_seq = row if row else (None, 0)
+        rows = connection.execute(
+            'SELECT seq, role, content, tokens FROM messages WHERE session_id = ? AND seq > ? ORDER BY seq',
+            (session_id, covered_seq)
+        ).fetchall()
+
+        total = sum(tokens for _, _, _, tokens in rows)
+        if total > self.token_budget:
+            # Fold the oldest turns until the rest fits COMPACT_TO of the budget
+            folded = 0
+            while folded < len(rows) and total > self.token_budget * COMPACT_TO:
+                total -= rows[folded][3]
+                folded += 1
+            summary = self._fold(summary, rows[:folded])
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO summaries (session_id, summary, covered_seq) VALUES (?, ?, ?)',
+                    (session_id, summary, rows[folded - 1][0])
+                )
+            rows = rows[folded:]
+
+        return summary, [{'role': role, 'content': content} for _, role, content, _ in rows]
+
+    def _fold(self, summary: Optional[str], rows: List[tuple]) -> str:
+        """Extend the summary with one line per folded message, dropping its oldest lines beyond the budget"""
+        lines = summary.split('\n') if summary else []
+        speakers = {'user': 'Client', 'assistant': 'Advisor'}
+        lines.extend(
+            f"- {speakers.get(role, role.title())}: {_first_sentence(content)}" for _, role, content, _ in rows
+        )
+        while len(lines) > 1 and estimate_tokens('\n'.join(lines)) > self.summary_budget:
+            lines.pop(0)
+        return '\n'.join(lines)
+
+    def clear(self, session_id: str) -> None:
+        """Forget a session"""
+        connection = self._connect()
+        with connection:
+            connection.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+            connection.execute('DELETE FROM summaries WHERE session_id = ?', (session_id,))
+            connection.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
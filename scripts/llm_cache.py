@@ -0,0 +1,166 @@
+"""
+Disk-backed cache of LLM completions.
+
+Responses are stored in SQLite under a hash of the canonical request (model,
+messages, temperature, token limit), so an unchanged prompt is answered
+without a network round-trip. The database runs in WAL mode, which lets the
+API's worker processes read concurrently while one of them writes; each
+process opens its own connection. Entries expire after ``ttl`` seconds and
+the least recently used ones are evicted beyond ``max_entries``. Hit and miss
+counts are kept in the database too, so they cover every process sharing it.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'llm_cache.sqlite3'
+)
+DEFAULT_TTL = 3600.0  # seconds
+DEFAULT_MAX_ENTRIES = 1000
+BUSY_TIMEOUT = 30.0  # seconds to wait for another process's write lock
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def make_key(model: str, messages: List[Dict], temperature: float, max_tokens: int, **params: Any) -> str:
+    """Canonical hash of a chat completion request"""
+    request = {
+        'model': model,
+        'messages': messages,
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+        **params
+    }
+    canonical = json.dumps(request, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite response cache with TTL expiry and LRU eviction.
+
+    Args:
+        path: Database file, shared by all processes using the cache.
+        ttl: Seconds a response stays valid.
+        max_entries: Entries kept after eviction, most recently used first.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "LLMResponseCache":
+        """Cache configured by LLM_CACHE_PATH, LLM_CACHE_TTL and LLM_CACHE_MAX_ENTRIES"""
+        return cls(
+            path=os.getenv('LLM_CACHE_PATH', DEFAULT_PATH),
+            ttl=float(os.getenv('LLM_CACHE_TTL', DEFAULT_TTL)),
+            max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection of the current process (connections must not cross a fork)"""
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def _count(self, connection: sqlite3.Connection, name: str) -> None:
+        connection.execute(
+            'INSERT INTO stats (name, value) VALUES (?, 1) '
+            'ON CONFLICT (name) DO UPDATE SET value = value + 1',
+            (name,)
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for a key, or None if absent or expired"""
+        if not self.enabled:
+            return None
+
+        connection = self._connect()
+        now = time.time()
+        with connection:
+            row = connection.execute(
+                'SELECT response FROM responses WHERE key = ? AND created > ?', (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                self._count(connection, 'misses')
+                return None
+
+            connection.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            self.hits += 1
+            self._count(connection, 'hits')
+        return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response, then drop expired and least recently used entries"""
+        if not self.enabled:
+            return
+
+        connection = self._connect()
+        now = time.time()
+        with connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)',
+                (key, response, now, now)
+            )
+            connection.execute('DELETE FROM responses WHERE created <= ?', (now - self.ttl,))
+            connection.execute(
+                'DELETE FROM responses WHERE key IN '
+                '(SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counts of this process and of all processes sharing the database"""
+        connection = self._connect()
+        shared = dict(connection.execute('SELECT name, value FROM stats').fetchall())
+        hits, misses = shared.get('hits', 0), shared.get('misses', 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'entries': connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0],
+            'process_hits': self.hits,
+            'process_misses': self.misses
+        }
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters"""
+        connection = self._connect()
+        with connection:
+            connection.execute('DELETE FROM responses')
+            connection.execute('DELETE FROM stats')
+        self.hits = self.misses = 0
@@ -0,0 +1,551 @@
+"""
+Rate-limited, priority-aware scheduler for LLM API calls.
+
+Every Groq request goes through an ``LLMScheduler``, which admits a request
+only when two token buckets allow it: requests per minute and (estimated)
+tokens per minute. Waiting requests are admitted strictly by priority class,
+interactive chat before dashboard analyses before background jobs, and first
+come first served within a class, so a burst of batch work cannot hold up a
+user. Identical requests already in flight in a process are merged into one
+call. A 429 response pauses all admissions, for the server's Retry-After or
+an exponential backoff with jitter, and the request is retried.
+
+The buckets, the pause and the queue of waiting requests live in SQLite (WAL
+mode), so the API's worker processes and the news agent share one account
+budget and one priority order: a batch request in one process waits while an
+interactive request in another is queued. Waiters poll the database, which
+costs a few short transactions per request at API rate-limit scales; a waiter
+whose process died stops blocking the queue after ``WAITER_TIMEOUT``. Both
+blocking (``call``) and asyncio (``acall``) callers are supported.
+"""
+
+import asyncio
+import itertools
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'llm_scheduler.sqlite3'
+)
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_TOKENS_PER_MINUTE = 6000
+DEFAULT_MAX_RETRIES = 3
+BACKOFF_BASE = 1.0  # seconds before the first retry, doubled on each further one
+BACKOFF_MAX = 30.0
+POLL_INTERVAL = 0.05  # seconds between admission checks of a queued request
+HEARTBEAT_INTERVAL = 1.0  # seconds between a waiter's liveness updates
+WAITER_TIMEOUT = 10.0  # waiters silent this long (dead processes) are dropped
+BUSY_TIMEOUT = 30.0
+WAIT_SAMPLES = 1000  # recent queue waits kept per priority class for the percentiles
+
+INTERACTIVE = 'interactive'
+STANDARD = 'standard'
+BATCH = 'batch'
+PRIORITIES = (INTERACTIVE, STANDARD, BATCH)  # in admission order
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    level REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS waiters (
+    id TEXT PRIMARY KEY,
+    rank INTEGER NOT NULL,
+    enqueued REAL NOT NULL,
+    priority TEXT NOT NULL,
+    heartbeat REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS waiters_order ON waiters (rank, enqueued, id);
+CREATE TABLE IF NOT EXISTS state (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+COUNTERS = ('admitted', 'merged', 'rate_limited', 'retries', 'failed')
+
+
+class RateLimited(Exception):
+    """Raised by a request function when the API answers 429 Too Many Requests"""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__(f"Rate limited (retry after {retry_after} s)" if retry_after else "Rate limited")
+        self.retry_after = retry_after
+
+
+def estimate_request_tokens(messages: List[Dict], max_tokens: int) -> int:
+    """Tokens a chat completion counts against the TPM limit: prompt (about 4 characters per token) plus completion limit"""
+    return sum((len(str(message.get('content', ''))) + 3) // 4 + 4 for message in messages) + max_tokens
+
+
+def _rate_limit_delay(error: BaseException) -> Optional[float]:
+    """
+    None if ``error`` is not a rate limit response, else the server's
+    Retry-After in seconds (0.0 if it sent none)
+    """
+    if isinstance(error, RateLimited):
+        return error.retry_after or 0.0
+    if getattr(error, 'status_code', None) != 429 and getattr(error, 'status', None) != 429:
+        return None
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after') or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _Ticket:
+    """A request waiting for admission; its queue position survives retries"""
+    __slots__ = ('id', 'priority', 'rank', 'enqueued', 'tokens', 'heartbeat')
+
+    def __init__(self, priority: str, tokens: int):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}, expected one of {PRIORITIES}")
+        self.id = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self.priority = priority
+        self.rank = PRIORITIES.index(priority)
+        self.enqueued = time.time()
+        self.tokens = tokens
+        self.heartbeat = 0.0
+
+
+class _SharedCall:
+    """Result of a blocking call that merged callers wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+    def wait(self) -> Any:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM requests, shared by all processes using the same database.
+
+    Args:
+        path: Database file holding the buckets and the queue.
+        requests_per_minute: Request budget of the account (0 disables the limit).
+        tokens_per_minute: Token budget of the account (0 disables the limit).
+        max_retries: Retries of a request answered with 429 before the error is raised.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+        max_retries: int = DEFAULT_MAX_RETRIES
+    ):
+        self.path = path
+        self.limits = {'requests': float(requests_per_minute), 'tokens': float(tokens_per_minute)}
+        self.max_retries = max_retries
+
+        # Guards the connection (shared by threads) and the merge tables
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._inflight: Dict[str, _SharedCall] = {}
+        self._async_inflight: Dict[tuple, asyncio.Task] = {}
+        self._waits: Dict[str, Deque[float]] = {priority: deque(maxlen=WAIT_SAMPLES) for priority in PRIORITIES}
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        """Scheduler configured by LLM_SCHEDULER_PATH, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE and LLM_MAX_RETRIES"""
+        return cls(
+            path=os.getenv('LLM_SCHEDULER_PATH', DEFAULT_PATH),
+            requests_per_minute=float(os.getenv('LLM_REQUESTS_PER_MINUTE', DEFAULT_REQUESTS_PER_MINUTE)),
+            tokens_per_minute=float(os.getenv('LLM_TOKENS_PER_MINUTE', DEFAULT_TOKENS_PER_MINUTE)),
+            max_retries=int(os.getenv('LLM_MAX_RETRIES', DEFAULT_MAX_RETRIES))
+        )
+
+    # Shared state
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection of the current process (connections must not cross a fork)"""
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction that takes the database lock up front, so read-modify-write steps are atomic"""
+        with self._lock:
+            connection = self._connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    def _read(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    @staticmethod
+    def _add(connection: sqlite3.Connection, name: str, amount: float = 1) -> None:
+        connection.execute(
+            'INSERT INTO state (name, value) VALUES (?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+            (name, amount)
+        )
+
+    @staticmethod
+    def _raise_to(connection: sqlite3.Connection, name: str, value: float) -> None:
+        connection.execute(
+            'INSERT INTO state (name, value) VALUES (?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)',
+            (name, value)
+        )
+
+    def _level(self, connection: sqlite3.Connection, name: str, now: float) -> float:
+        """Current level of a bucket, refilled continuously at its per-minute rate"""
+        capacity = self.limits[name]
+        row = connection.execute('SELECT level, updated FROM buckets WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return capacity
+        level, updated = row
+        return min(capacity, level + max(now - updated, 0.0) * capacity / 60)
+
+    @staticmethod
+    def _set_level(connection: sqlite3.Connection, name: str, level: float, now: float) -> None:
+        connection.execute(
+            'INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)', (name, level, now)
+        )
+
+    # Admission
+
+    def _enqueue(self, ticket: _Ticket) -> None:
+        now = time.time()
+        ticket.heartbeat = now
+        with self._transaction() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO waiters (id, rank, enqueued, priority, heartbeat) VALUES (?, ?, ?, ?, ?)',
+                (ticket.id, ticket.rank, ticket.enqueued, ticket.priority, now)
+            )
+            depth = connection.execute(
+                'SELECT COUNT(*) FROM waiters WHERE heartbeat > ?', (now - WAITER_TIMEOUT,)
+            ).fetchone()[0]
+            self._raise_to(connection, 'peak_queue_depth', depth)
+
+    def _head(self, now: float) -> Optional[str]:
+        rows = self._read(
+            'SELECT id FROM waiters WHERE heartbeat > ? ORDER BY rank, enqueued, id LIMIT 1',
+            (now - WAITER_TIMEOUT,)
+        )
+        return rows[0][0] if rows else None
+
+    def _try_admit(self, ticket: _Ticket) -> Optional[float]:
+        """0.0 once admitted, else seconds until capacity frees up (None while other requests are ahead)"""
+        now = time.time()
+        # Waiters behind others only read, and write just to show they are alive
+        if now - ticket.heartbeat < HEARTBEAT_INTERVAL and self._head(now) != ticket.id:
+            return None
+
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM waiters WHERE heartbeat <= ?', (now - WAITER_TIMEOUT,))
+            connection.execute(
+                'INSERT OR REPLACE INTO waiters (id, rank, enqueued, priority, heartbeat) VALUES (?, ?, ?, ?, ?)',
+                (ticket.id, ticket.rank, ticket.enqueued, ticket.priority, now)
+            )
+            ticket.heartbeat = now
+            head = connection.execute('SELECT id FROM waiters ORDER BY rank, enqueued, id LIMIT 1').fetchone()
+            if head[0] != ticket.id:
+                return None
+
+            paused = connection.execute("SELECT value FROM state WHERE name = 'paused_until'").fetchone()
+            delay = (paused[0] - now) if paused else 0.0
+            levels = {}
+            for name, amount in (('requests', 1), ('tokens', ticket.tokens)):
+                capacity = self.limits[name]
+                if capacity <= 0:
+                    continue
+                # A request larger than the bucket waits for a full one
+                amount = min(amount, capacity)
+                level = self._level(connection, name, now)
+                if level < amount:
+                    delay = max(delay, (amount - level) * 60 / capacity)
+                levels[name] = level - amount
+            if delay > 0:
+                return delay
+
+            for name, level in levels.items():
+                self._set_level(connection, name, level, now)
+            connection.execute('DELETE FROM waiters WHERE id = ?', (ticket.id,))
+            wait = now - ticket.enqueued
+            self._add(connection, 'admitted')
+            self._add(connection, f'wait_count:{ticket.priority}')
+            self._add(connection, f'wait_sum:{ticket.priority}', wait)
+            self._raise_to(connection, f'wait_max:{ticket.priority}', wait)
+        self._waits[ticket.priority].append(wait)
+        return 0.0
+
+    def _abandon(self, ticket: _Ticket) -> None:
+        """Drop a cancelled waiter, letting the next one move up"""
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM waiters WHERE id = ?', (ticket.id,))
+
+    def _acquire(self, ticket: _Ticket) -> None:
+        self._enqueue(ticket)
+        try:
+            while True:
+                delay = self._try_admit(ticket)
+                if delay == 0:
+                    return
+                time.sleep(POLL_INTERVAL if delay is None else min(delay, HEARTBEAT_INTERVAL))
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    async def _acquire_async(self, ticket: _Ticket) -> None:
+        self._enqueue(ticket)
+        try:
+            while True:
+                delay = self._try_admit(ticket)
+                if delay == 0:
+                    return
+                await asyncio.sleep(POLL_INTERVAL if delay is None else min(delay, HEARTBEAT_INTERVAL))
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    # Retries
+
+    def _backoff(self, error: BaseException, attempt: int) -> bool:
+        """Pause admissions after a 429 and tell whether to retry; other errors are not retried"""
+        retry_after = _rate_limit_delay(error)
+        with self._transaction() as connection:
+            if retry_after is not None:
+                self._add(connection, 'rate_limited')
+            if retry_after is None or attempt >= self.max_retries:
+                self._add(connection, 'failed')
+                return False
+
+            delay = retry_after or min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+            self._raise_to(connection, 'paused_until', time.time() + delay)
+            self._add(connection, 'retries')
+            return True
+
+    def _settle(self, tokens: int, result: Any, usage: Optional[Callable[[Any], Optional[int]]]) -> None:
+        """Correct the token bucket by the difference between the estimate and the reported usage"""
+        capacity = self.limits['tokens']
+        if usage is None or capacity <= 0:
+            return
+        try:
+            used = usage(result)
+        except Exception:
+            return
+        if used:
+            now = time.time()
+            with self._transaction() as connection:
+                level = self._level(connection, 'tokens', now) + min(tokens, capacity) - used
+                self._set_level(connection, 'tokens', min(capacity, level), now)
+
+    def _run(self, request: Callable[[], Any], tokens: int, priority: str, usage) -> Any:
+        ticket = _Ticket(priority, tokens)
+        for attempt in itertools.count():
+            self._acquire(ticket)
+            try:
+                result = request()
+            except Exception as error:
+                if self._backoff(error, attempt):
+                    continue
+                raise
+            self._settle(tokens, result, usage)
+            return result
+
+    async def _arun(self, request: Callable[[], Awaitable[Any]], tokens: int, priority: str, usage) -> Any:
+        ticket = _Ticket(priority, tokens)
+        for attempt in itertools.count():
+            await self._acquire_async(ticket)
+            try:
+                result = await request()
+            except Exception as error:
+                if self._backoff(error, attempt):
+                    continue
+                raise
+            self._settle(tokens, result, usage)
+            return result
+
+    # Public API
+
+    def call(
+        self,
+        request: Callable[[], Any],
+        tokens: int = 1,
+        priority: str = STANDARD,
+        key: Optional[str] = None,
+        usage: Optional[Callable[[Any], Optional[int]]] = None
+    ) -> Any:
+        """
+        Run ``request()`` once the limits admit it, blocking until then.
+
+        Args:
+            request: Function making the API call; raises on failure (a 429
+                as ``RateLimited`` or an exception with ``status_code`` 429).
+            tokens: Estimated tokens of the request (see ``estimate_request_tokens``).
+            priority: INTERACTIVE, STANDARD or BATCH.
+            key: Identity of the request (e.g. ``llm_cache.make_key``); callers
+                in this process with the key of a request in flight wait for
+                its result instead of sending their own.
+            usage: Extracts the actual token count from the result, so the
+                token bucket is charged what was used rather than the estimate.
+
+        Returns:
+            Whatever ``request`` returned
+        """
+        if key is None:
+            return self._run(request, tokens, priority, usage)
+
+        with self._lock:
+            shared = self._inflight.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._inflight[key] = _SharedCall()
+        if not leader:
+            self._count_merge()
+            return shared.wait()
+
+        try:
+            shared.result = self._run(request, tokens, priority, usage)
+            return shared.result
+        except BaseException as error:
+            shared.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            shared.done.set()
+
+    async def acall(
+        self,
+        request: Callable[[], Awaitable[Any]],
+        tokens: int = 1,
+        priority: str = STANDARD,
+        key: Optional[str] = None,
+        usage: Optional[Callable[[Any], Optional[int]]] = None
+    ) -> Any:
+        """
+        Async ``call``: ``request`` returns an awaitable, and waiting does not block the event loop.
+
+        A merged request runs as its own task, so one caller being cancelled
+        does not cancel it for the others.
+        """
+        if key is None:
+            return await self._arun(request, tokens, priority, usage)
+
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        with self._lock:
+            task = self._async_inflight.get(slot)
+            merged = task is not None
+            if not merged:
+                task = loop.create_task(self._arun(request, tokens, priority, usage))
+                self._async_inflight[slot] = task
+                task.add_done_callback(lambda _: self._forget(slot))
+        if merged:
+            self._count_merge()
+        return await asyncio.shield(task)
+
+    def _forget(self, slot: tuple) -> None:
+        with self._lock:
+            self._async_inflight.pop(slot, None)
+
+    def _count_merge(self) -> None:
+        with self._transaction() as connection:
+            self._add(connection, 'merged')
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Queue depth, queue wait times per priority class and request counts
+        across all processes sharing the database, for tuning the limits.
+        Wait percentiles cover this process only.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            shared = dict(connection.execute('SELECT name, value FROM state').fetchall())
+            waiting = connection.execute(
+                'SELECT priority, COUNT(*), MIN(enqueued) FROM waiters WHERE heartbeat > ? GROUP BY priority',
+                (now - WAITER_TIMEOUT,)
+            ).fetchall()
+            levels = {
+                name: self._level(connection, name, now) if capacity > 0 else None
+                for name, capacity in self.limits.items()
+            }
+
+        depth = {priority: 0 for priority in PRIORITIES}
+        oldest = {priority: 0.0 for priority in PRIORITIES}
+        for priority, count, enqueued in waiting:
+            depth[priority] = count
+            oldest[priority] = now - enqueued
+
+        waits = {}
+        for priority in PRIORITIES:
+            count = int(shared.get(f'wait_count:{priority}', 0))
+            samples = sorted(self._waits[priority])
+            waits[priority] = {
+                'count': count,
+                'mean': shared.get(f'wait_sum:{priority}', 0.0) / count if count else 0.0,
+                'max': shared.get(f'wait_max:{priority}', 0.0),
+                'p50': samples[len(samples) // 2] if samples else 0.0,
+                'p95': samples[int(len(samples) * 0.95)] if samples else 0.0,
+                # Longest current wait, which the completed samples do not show yet
+                'oldest_waiting': oldest[priority]
+            }
+
+        return {
+            'queue_depth': sum(depth.values()),
+            'queue_depth_by_priority': depth,
+            'peak_queue_depth': int(shared.get('peak_queue_depth', 0)),
+            'wait_seconds': waits,
+            'paused_for': max(shared.get('paused_until', 0.0) - now, 0.0),
+            'requests_per_minute': self.limits['requests'] or None,
+            'tokens_per_minute': self.limits['tokens'] or None,
+            'available_requests': levels['requests'],
+            'available_tokens': levels['tokens'],
+            **{name: int(shared.get(name, 0)) for name in COUNTERS}
+        }
+
+    def clear(self) -> None:
+        """Refill the buckets and reset the queue, pause and counters"""
+        with self._transaction() as connection:
+            for table in ('buckets', 'waiters', 'state'):
+                connection.execute(f'DELETE FROM {table}')
+        for samples in self._waits.values():
+            samples.clear()
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """The process's scheduler, configured from the environment on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler.from_env()
+        return _scheduler
@@ -1,11 +1,16 @@
 import os
 import json
-from typing import Dict, List, Any
+import hashlib
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Union
 from dataclasses import dataclass
 from datetime import datetime
 import numpy as np
 import pandas as pd
 
+# Default category orders; unseen labels are appended as they appear
+ASSET_TYPES = ['stock', 'bond', 'crypto', 'cash']
+REGIONS = ['US', 'Developed', 'Emerging', 'Global']
+
 @dataclass
 class Asset:
     symbol: str
@@ -17,16 +22,436 @@ class Asset:
     current_price: float
     change_percent: float
 
+class AssetView:
+    """
+    Zero-copy, Asset-like view of one row of a PortfolioFrame.
+
+    Reads come straight from the frame's columns and assignments write back
+    to them, so code written against ``Asset`` objects keeps working.
+    """
+    __slots__ = ('_frame', '_index')
+
+    def __init__(self, frame: "PortfolioFrame", index: int):
+        self._frame = frame
+        self._index = index
+
+    def _float_column(name: str):
+        def getter(self) -> float:
+            return float(getattr(self._frame, name)[self._index])
+
+        def setter(self, value: float) -> None:
+            getattr(self._frame, name)[self._index] = value
+            self._frame.touch()
+
+        return property(getter, setter)
+
+    def _category_column(name: str):
+        def getter(self) -> str:
+            frame = self._frame
+            return getattr(frame, f"{name}_categories")[getattr(frame, f"{name}_code")[self._index]]
+
+        def setter(self, value: str) -> None:
+            frame = self._frame
+            getattr(frame, f"{name}_code")[self._index] = frame._category_code(name, value)
+            frame.touch()
+
+        return property(getter, setter)
+
+    def _label_column(name: str):
+        def getter(self) -> str:
+            return getattr(self._frame, name)[self._index]
+
+        def setter(self, value: str) -> None:
+            getattr(self._frame, name)[self._index] = value
+            self._frame.touch()
+
+        return property(getter, setter)
+
+    symbol = _label_column('symbol')
+    name = _label_column('name')
+    asset_type = _category_column('asset_type')
+    region = _category_column('region')
+    allocation = _float_column('allocation')
+    value = _float_column('value')
+    current_price = _float_column('current_price')
+    change_percent = _float_column('change_percent')
+
+    del _float_column, _category_column, _label_column
+
+    def to_asset(self) -> Asset:
+        """Detached Asset copy of this row"""
+        return Asset(self.symbol, self.name, self.asset_type, self.region,
+                     self.allocation, self.value, self.current_price, self.change_percent)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (Asset, AssetView)):
+            return self.to_asset() == (other if isinstance(other, Asset) else other.to_asset())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(self.to_asset()).replace('Asset(', 'AssetView(', 1)
+
+class PortfolioFrame:
+    """
+    Columnar, array-backed container of holdings.
+
+    ``asset_type`` and ``region`` are stored as integer category codes and the
+    numeric fields as float64 columns, so group-bys are a single ``np.bincount``
+    and metrics are dot products. Iterating or indexing yields ``AssetView``
+    objects, which behave like ``Asset`` instances without copying.
+    """
+    FLOAT_COLUMNS = ('allocation', 'value', 'current_price', 'change_percent')
+
+    def __init__(
+        self,
+        symbol: Iterable[str],
+        name: Iterable[str],
+        asset_type: Iterable[str],
+        region: Iterable[str],
+        allocation: Iterable[float],
+        value: Iterable[float],
+        current_price: Iterable[float],
+        change_percent: Iterable[float]
+    ):
+        self.symbol = np.array(list(symbol), dtype=object)
+        self.name = np.array(list(name), dtype=object)
+
+        self.asset_type_categories = list(ASSET_TYPES)
+        self.region_categories = list(REGIONS)
+        self.asset_type_code = self._encode('asset_type', asset_type)
+        self.region_code = self._encode('region', region)
+
+        self.allocation = np.asarray(allocation, dtype=np.float64).copy()
+        self.value = np.asarray(value, dtype=np.float64).copy()
+        self.current_price = np.asarray(current_price, dtype=np.float64).copy()
+        self.change_percent = np.asarray(change_percent, dtype=np.float64).copy()
+
+        self.version = 0
+        self._fingerprint: Optional[tuple] = None
+
+    @classmethod
+    def from_assets(cls, assets: Iterable[Union[Asset, AssetView]]) -> "PortfolioFrame":
+        """Build a frame from Asset objects"""
+        assets = list(assets)
+        return cls(
+            (a.symbol for a in assets),
+            (a.name for a in assets),
+            (a.asset_type for a in assets),
+            (a.region for a in assets),
+            [a.allocation for a in assets],
+            [a.value for a in assets],
+            [a.current_price for a in assets],
+            [a.change_percent for a in assets]
+        )
+
+    def _category_code(self, column: str, label: str) -> int:
+        categories = getattr(self, f"{column}_categories")
+        if label not in categories:
+            categories.append(label)
+        return categories.index(label)
+
+    def _encode(self, column: str, labels: Iterable[str]) -> np.ndarray:
+        codes = {label: i for i, label in enumerate(getattr(self, f"{column}_categories"))}
+        return np.array(
+            [codes[label] if label in codes else codes.setdefault(label, self._category_code(column, label))
+             for label in labels],
+            dtype=np.int16
+        )
+
+    def touch(self) -> None:
+        """
+        Record that holdings or prices changed (invalidates derived views).
+
+        Called automatically by ``append`` and ``AssetView`` setters; code that
+        writes to the column arrays directly must call it itself.
+        """
+        self.version += 1
+
+    def __len__(self) -> int:
+        return len(self.symbol)
+
+    def __iter__(self) -> Iterator[AssetView]:
+        return (AssetView(self, i) for i in range(len(self)))
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [AssetView(self, i) for i in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("PortfolioFrame index out of range")
+        return AssetView(self, index)
+
+    def append(self, asset: Union[Asset, AssetView]) -> None:
+        """Add a holding"""
+        self.symbol = np.append(self.symbol, np.array([asset.symbol], dtype=object))
+        self.name = np.append(self.name, np.array([asset.name], dtype=object))
+        self.asset_type_code = np.append(
+            self.asset_type_code, np.int16(self._category_code('asset_type', asset.asset_type))
+        )
+        self.region_code = np.append(self.region_code, np.int16(self._category_code('region', asset.region)))
+        for column in self.FLOAT_COLUMNS:
+            setattr(self, column, np.append(getattr(self, column), getattr(asset, column)))
+        self.touch()
+
+    def group_sum(self, column: str, by: str = 'asset_type') -> Dict[str, float]:
+        """Sum a float column per asset_type or region category"""
+        categories = getattr(self, f"{by}_categories")
+        totals = np.bincount(
+            getattr(self, f"{by}_code"), weights=getattr(self, column), minlength=len(categories)
+        )
+        return dict(zip(categories, totals.tolist()))
+
+    def fingerprint(self) -> str:
+        """Hash of every column, recomputed only when the frame version changes"""
+        if self._fingerprint is None or self._fingerprint[0] != self.version:
+            digest = hashlib.sha256()
+            digest.update("\x1f".join(self.symbol.tolist()).encode())
+            digest.update("\x1f".join(self.name.tolist()).encode())
+            digest.update("\x1f".join(self.asset_type_categories + self.region_categories).encode())
+            for column in ('asset_type_code', 'region_code') + self.FLOAT_COLUMNS:
+                digest.update(getattr(self, column).tobytes())
+            self._fingerprint = (self.version, digest.hexdigest())
+        return self._fingerprint[1]
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Holdings as a list of plain dicts for JSON serialization"""
+        asset_types = np.array(self.asset_type_categories, dtype=object)[self.asset_type_code]
+        regions = np.array(self.region_categories, dtype=object)[self.region_code]
+        columns = zip(
+            self.symbol.tolist(), self.name.tolist(), asset_types.tolist(), regions.tolist(),
+            self.allocation.tolist(), self.value.tolist(), self.current_price.tolist(),
+            self.change_percent.tolist()
+        )
+        return [
+            {
+                "symbol": symbol,
+                "name": name,
+                "asset_type": asset_type,
+                "region": region,
+                "allocation": allocation,
+                "value": value,
+                "current_price": current_price,
+                "change_percent": change_percent
+            }
+            for symbol, name, asset_type, region, allocation, value, current_price, change_percent in columns
+        ]
+
+class StreamingCovariance:
+    """
+    Incremental mean and covariance of per-asset daily returns.
+
+    Keeps a Welford/Chan running mean and co-moment matrix (exact sample
+    covariance over all bars seen) next to a RiskMetrics-style EWMA covariance
+    that weights recent bars more. Each bar costs one O(n^2) outer-product
+    update, batches of bars fold in with a matrix product, and the state can be
+    saved with ``save`` and restored with ``load`` instead of rescanning history.
+    """
+
+    def __init__(self, symbols: Iterable[str], decay: float = 0.94):
+        if not 0 < decay < 1:
+            raise ValueError("decay must be between 0 and 1")
+
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.decay = decay
+        n = len(self.symbols)
+        self.count = 0
+        self.mean = np.zeros(n)
+        self.comoment = np.zeros((n, n))
+        self.ewma = np.zeros((n, n))
+        # Total EWMA weight applied so far (1 - decay ** count), for bias correction
+        self.ewma_weight = 0.0
+
+    def update(self, returns: np.ndarray) -> None:
+        """Fold in one bar (n,) or a block of bars (k, n) of returns, oldest first"""
+        returns = np.atleast_2d(np.asarray(returns, dtype=np.float64))
+        if returns.shape[1] != len(self.symbols):
+            raise ValueError(f"Expected {len(self.symbols)} returns per bar, got {returns.shape[1]}")
+        k = returns.shape[0]
+        if k == 0:
+            return
+
+        batch_mean = returns.mean(axis=0)
+        centered = returns - batch_mean
+        count = self.count + k
+        delta = batch_mean - self.mean
+        self.comoment += centered.T @ centered + np.outer(delta, delta) * (self.count * k / count)
+        self.mean += delta * (k / count)
+        self.count = count
+
+        weights = (1 - self.decay) * self.decay ** np.arange(k - 1, -1, -1)
+        self.ewma = self.decay ** k * self.ewma + (returns * weights[:, None]).T @ returns
+        self.ewma_weight = self.decay ** k * self.ewma_weight + weights.sum()
+
+    def covariance(self, ewma: bool = True) -> np.ndarray:
+        """EWMA (default) or sample covariance of one bar's returns"""
+        if self.count < 2:
+            raise ValueError("At least two bars are needed for a covariance estimate")
+        if ewma:
+            return self.ewma / self.ewma_weight
+        return self.comoment / (self.count - 1)
+
+    def save(self, path: str) -> None:
+        """Write the estimator state to an ``.npz`` file (replaced atomically)"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f, symbols=np.array(self.symbols), decay=self.decay, count=self.count, mean=self.mean,
+                comoment=self.comoment, ewma=self.ewma, ewma_weight=self.ewma_weight
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "StreamingCovariance":
+        """Restore an estimator written by ``save``"""
+        with np.load(path) as state:
+            estimator = cls(state['symbols'].tolist(), float(state['decay']))
+            estimator.count = int(state['count'])
+            estimator.mean = state['mean'].copy()
+            estimator.comoment = state['comoment'].copy()
+            estimator.ewma = state['ewma'].copy()
+            estimator.ewma_weight = float(state['ewma_weight'])
+        return estimator
+
 @dataclass
 class Portfolio:
     total_value: float
-    assets: List[Asset]
+    assets: PortfolioFrame
     risk_profile: str
     last_updated: datetime
 
 class PortfolioManager:
     def __init__(self):
         self.portfolio = self._initialize_portfolio()
+        self._memo: Dict[str, Any] = {}
+        self._memo_state: Optional[tuple] = None
+        self.return_estimator: Optional[StreamingCovariance] = None
+
+    def _state_version(self) -> tuple:
+        """
+        Cheap token that changes whenever holdings, prices or portfolio fields change.
+
+        Holdings and prices are covered by the frame's version counter (bumped
+        by ``update_prices``, ``mark_dirty`` and every ``AssetView`` write),
+        return history by the estimator's bar count.
+        """
+        portfolio = self.portfolio
+        estimator = self.return_estimator
+        return (
+            id(portfolio), id(portfolio.assets), portfolio.assets.version,
+            portfolio.total_value, portfolio.risk_profile, portfolio.last_updated,
+            id(estimator), estimator.count if estimator is not None else 0
+        )
+
+    def _memoized(self, name: str, compute):
+        """Return the cached value of a derived view, recomputing it only after a state change"""
+        state = self._state_version()
+        if state != self._memo_state:
+            self._memo.clear()
+            self._memo_state = state
+
+        if name not in self._memo:
+            self._memo[name] = compute()
+        return self._memo[name]
+
+    def mark_dirty(self) -> None:
+        """Invalidate derived views after writing to the frame's columns directly"""
+        self.portfolio.assets.touch()
+
+    def update_prices(self, prices: Dict[str, float]) -> None:
+        """
+        Reprice holdings from a symbol -> price mapping.
+
+        Values move with the price (share counts are held fixed), change_percent
+        is the move from the previous price, and allocations are re-derived
+        from the new values.
+        """
+        frame = self.portfolio.assets
+        index = {symbol: i for i, symbol in enumerate(frame.symbol.tolist())}
+        rows = np.array([index[symbol] for symbol in prices if symbol in index], dtype=np.intp)
+        if rows.size == 0:
+            return
+
+        new_prices = np.array([prices[symbol] for symbol in prices if symbol in index], dtype=np.float64)
+        old_prices = frame.current_price[rows]
+        ratio = np.divide(new_prices, old_prices, out=np.ones_like(new_prices), where=old_prices != 0)
+
+        frame.value[rows] *= ratio
+        frame.change_percent[rows] = (ratio - 1) * 100
+        frame.current_price[rows] = new_prices
+
+        total_value = float(frame.value.sum())
+        if total_value > 0:
+            frame.allocation[:] = frame.value / total_value * 100
+        frame.touch()
+
+        self.portfolio.total_value = total_value
+        self.portfolio.last_updated = datetime.now()
+
+    def record_returns(self, returns: Dict[str, float]) -> None:
+        """
+        Add one bar of daily returns (percent) per symbol to the return history.
+
+        The history starts on the first call with the symbols given; later bars
+        must cover the same symbols.
+        """
+        if self.return_estimator is None:
+            self.return_estimator = StreamingCovariance(returns.keys())
+
+        estimator = self.return_estimator
+        missing = [symbol for symbol in estimator.symbols if symbol not in returns]
+        if missing:
+            raise ValueError(f"Missing returns for: {missing}")
+        estimator.update(np.array([returns[symbol] for symbol in estimator.symbols], dtype=np.float64))
+
+    def load_return_history(self, price_store, start=None, end=None) -> None:
+        """
+        Rebuild the return history from daily closes in a ``PriceStore``.
+
+        Holdings without price history (e.g. cash) are left out; see
+        ``return_covariance`` for how they are treated.
+        """
+        symbols = [symbol for symbol in self.portfolio.assets.symbol.tolist() if symbol in price_store]
+        prices = price_store.prices(symbols, start, end)
+        returns = (prices[1:] / prices[:-1] - 1) * 100
+        returns = returns[~np.isnan(returns).any(axis=1)]
+
+        estimator = StreamingCovariance(symbols)
+        estimator.update(returns)
+        self.return_estimator = estimator
+
+    def save_return_history(self, path: str) -> None:
+        """Persist the return history so a restart can resume it with ``restore_return_history``"""
+        if self.return_estimator is None:
+            raise ValueError("No return history recorded")
+        self.return_estimator.save(path)
+
+    def restore_return_history(self, path: str) -> None:
+        self.return_estimator = StreamingCovariance.load(path)
+
+    def return_covariance(self):
+        """
+        Mean and EWMA covariance of daily holding returns in frame order, or
+        None if there is too little history. Cash holdings without history
+        are treated as riskless; any other untracked holding disables the estimate.
+        """
+        estimator = self.return_estimator
+        if estimator is None or estimator.count < 2:
+            return None
+
+        frame = self.portfolio.assets
+        cash_code = frame.asset_type_categories.index('cash')
+        rows = np.array([estimator.index.get(symbol, -1) for symbol in frame.symbol.tolist()], dtype=np.intp)
+        tracked = rows >= 0
+        if not np.all(tracked | (frame.asset_type_code == cash_code)):
+            return None
+
+        mean = np.zeros(len(frame))
+        covariance = np.zeros((len(frame), len(frame)))
+        mean[tracked] = estimator.mean[rows[tracked]]
+        covariance[np.ix_(tracked, tracked)] = estimator.covariance()[np.ix_(rows[tracked], rows[tracked])]
+        return mean, covariance
     
     def _initialize_portfolio(self) -> Portfolio:
         """Initialize a sample portfolio"""
@@ -45,43 +470,48 @@ class PortfolioManager:
         
         return Portfolio(
             total_value=total_value,
-            assets=assets,
+            assets=PortfolioFrame.from_assets(assets),
             risk_profile="moderate",
             last_updated=datetime.now()
         )
     
     def get_asset_allocation(self) -> Dict[str, float]:
         """Get allocation by asset type"""
-        allocation = {"stock": 0, "bond": 0, "crypto": 0, "cash": 0}
-        
-        for asset in self.portfolio.assets:
-            allocation[asset.asset_type] += asset.allocation
-            
-        return allocation
+        return dict(self._memoized(
+            'asset_allocation', lambda: self.portfolio.assets.group_sum('allocation', by='asset_type')
+        ))
     
     def get_geographic_allocation(self) -> Dict[str, float]:
         """Get allocation by geographic region"""
-        allocation = {"US": 0, "Developed": 0, "Emerging": 0, "Global": 0}
-        
-        for asset in self.portfolio.assets:
-            allocation[asset.region] += asset.allocation
-            
-        return allocation
+        return dict(self._memoized(
+            'geographic_allocation', lambda: self.portfolio.assets.group_sum('allocation', by='region')
+        ))
     
     def calculate_portfolio_metrics(self) -> Dict[str, Any]:
         """Calculate key portfolio metrics"""
-        returns = [asset.change_percent for asset in self.portfolio.assets]
-        weights = [asset.allocation / 100 for asset in self.portfolio.assets]
+        return dict(self._memoized('metrics', self._compute_portfolio_metrics))
+
+    def _compute_portfolio_metrics(self) -> Dict[str, Any]:
+        returns = self.portfolio.assets.change_percent
+        weights = self.portfolio.assets.allocation / 100
         
         # Portfolio return
-        portfolio_return = sum(r * w for r, w in zip(returns, weights))
+        portfolio_return = float(returns @ weights)
         
-        # Portfolio volatility (simplified)
-        portfolio_volatility = np.std(returns) * np.sqrt(252)  # Annualized
+        risk_free_rate = 3.0
+        history = self.return_covariance()
+        if history is not None:
+            # Annualized from the recorded daily return history
+            mean, covariance = history
+            portfolio_volatility = float(np.sqrt(max(weights @ covariance @ weights, 0.0) * 252))
+            annual_return = float(mean @ weights) * 252
+        else:
+            # Portfolio volatility (simplified: cross-section of today's moves)
+            portfolio_volatility = np.std(returns) * np.sqrt(252)  # Annualized
+            annual_return = portfolio_return * 252
         
         # Sharpe ratio (assuming 3% risk-free rate)
-        risk_free_rate = 3.0
-        sharpe_ratio = (portfolio_return * 252 - risk_free_rate) / portfolio_volatility if portfolio_volatility > 0 else 0
+        sharpe_ratio = (annual_return - risk_free_rate) / portfolio_volatility if portfolio_volatility > 0 else 0
         
         return {
             "portfolio_return": portfolio_return,
@@ -118,22 +548,22 @@ class PortfolioManager:
         }
     
     def to_dict(self) -> Dict[str, Any]:
-        """Convert portfolio to dictionary for JSON serialization"""
+        """
+        Convert portfolio to dictionary for JSON serialization.
+
+        The result is memoized until the portfolio changes and is shared
+        between callers, so treat it as read-only.
+        """
+        return self._memoized('to_dict', self._build_dict)
+
+    def to_json(self) -> str:
+        """Pre-serialized JSON of ``to_dict``, memoized until the portfolio changes"""
+        return self._memoized('to_json', lambda: json.dumps(self.to_dict()))
+
+    def _build_dict(self) -> Dict[str, Any]:
         return {
             "total_value": self.portfolio.total_value,
-            "assets": [
-                {
-                    "symbol": asset.symbol,
-                    "name": asset.name,
-                    "asset_type": asset.asset_type,
-                    "region": asset.region,
-                    "allocation": asset.allocation,
-                    "value": asset.value,
-                    "current_price": asset.current_price,
-                    "change_percent": asset.change_percent
-                }
-                for asset in self.portfolio.assets
-            ],
+            "assets": self.portfolio.assets.to_records(),
             "risk_profile": self.portfolio.risk_profile,
             "last_updated": self.portfolio.last_updated.isoformat(),
             "metrics": self.calculate_portfolio_metrics(),
@@ -147,7 +577,7 @@ if __name__ == "__main__":
     portfolio_data = pm.to_dict()
 
     # 1️⃣  Emit machine-readable JSON for the API route
-    print(json.dumps(portfolio_data))
+    print(pm.to_json())
 
     # 2️⃣  Human-readable summary follows
     #print("Portfolio Summary:")
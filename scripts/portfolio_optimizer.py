@@ -0,0 +1,429 @@
+"""
+Mean-variance portfolio optimization.
+
+Solves
+
+    minimize    1/2 w' C w - t * mu' w
+    subject to  lower <= w <= upper,  sum(w) = 1,
+                group_lower <= sum of w over a group <= group_upper
+
+with an OSQP-style ADMM. The constraint matrix is never formed: it is
+applied structurally (identity rows, one budget row and a few group
+indicator rows). The covariance is diagonalized once per optimizer, so each
+iteration is two matrix-vector products plus a tiny Woodbury correction
+whatever the step size, and a whole efficient frontier is solved together as
+one matrix right-hand side with a step size adapted per frontier point.
+Iterates are polished to the exact solution of their active set.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_MAX_ITERATIONS = 4000
+CHECK_EVERY = 10
+POLISH_EVERY = 10
+POLISH_STEPS = 25
+
+
+class PortfolioOptimizer:
+    """
+    Long-only mean-variance optimizer for a fixed covariance and constraint set.
+
+    Args:
+        covariance: (n, n) covariance of asset returns (any consistent units).
+        lower, upper: Per-asset weight bounds, scalars or (n,) arrays.
+        groups: Group constraints as ``(members, lower, upper)`` where
+            ``members`` is a boolean (n,) mask and the bounds apply to the total
+            weight of the group, e.g. an asset class or region.
+        rho, sigma, alpha: Initial ADMM step size (adapted per problem while
+            solving), regularization and relaxation.
+        eps_abs, eps_rel: Absolute and relative ADMM residual tolerances; the
+            result is then polished to an exact active-set solution when possible.
+    """
+
+    def __init__(
+        self,
+        covariance: np.ndarray,
+        lower=0.0,
+        upper=1.0,
+        groups: Sequence[Tuple[np.ndarray, float, float]] = (),
+        rho: float = 0.1,
+        sigma: float = 1e-6,
+        alpha: float = 1.6,
+        eps_abs: float = 1e-4,
+        eps_rel: float = 1e-4
+    ):
+        covariance = np.asarray(covariance, dtype=np.float64)
+        n = covariance.shape[0]
+        if covariance.shape != (n, n):
+            raise ValueError(f"Covariance must be square, got {covariance.shape}")
+
+        self.num_assets = n
+        # Normalize so the ADMM parameters behave the same for daily or annual inputs
+        self.scale = float(np.mean(np.diag(covariance))) or 1.0
+        self.P = covariance / self.scale
+
+        self.group_matrix = np.array([np.asarray(m, dtype=np.float64) for m, _, _ in groups]).reshape(-1, n)
+        self.lower = np.concatenate([
+            np.broadcast_to(np.asarray(lower, dtype=np.float64), (n,)), [1.0], [g[1] for g in groups]
+        ])
+        self.upper = np.concatenate([
+            np.broadcast_to(np.asarray(upper, dtype=np.float64), (n,)), [1.0], [g[2] for g in groups]
+        ])
+        if np.any(self.lower > self.upper):
+            raise ValueError("Every lower bound must be at most its upper bound")
+        if self.lower[:n].sum() > 1 or self.upper[:n].sum() < 1:
+            raise ValueError("Weight bounds leave no fully invested portfolio")
+
+        # Equality rows (the budget and any group with equal bounds) get a much
+        # stiffer step, as in OSQP. Box rows keep weight 1, so the constraint
+        # term of the ADMM system is rho (I + B' W B) with B the few budget and
+        # group rows.
+        self.row_weights = np.ones(len(self.lower))
+        self.row_weights[n:][self.lower[n:] == self.upper[n:]] = 1e3
+        self.rho = rho
+        self.sigma = sigma
+        self.alpha = alpha
+        self.eps_abs = eps_abs
+        self.eps_rel = eps_rel
+
+        # K(rho) = P + sigma I + rho (I + B' W B). With P = Q diag(lam) Q'
+        # computed once, K(rho)^-1 follows from the Woodbury identity and a
+        # (k, k) system per step size, so the step can differ per problem and
+        # adapt while solving without refactoring anything of size n.
+        self.eigenvalues, self.Q = np.linalg.eigh(self.P)
+        self.B_rotated = self.Q.T @ np.vstack([np.ones((1, n)), self.group_matrix]).T
+
+    def _apply(self, X: np.ndarray) -> np.ndarray:
+        """A @ X for the stacked [identity; budget; groups] constraint matrix"""
+        return np.vstack([X, X.sum(axis=0, keepdims=True), self.group_matrix @ X])
+
+    def _apply_t(self, V: np.ndarray) -> np.ndarray:
+        """A' @ V"""
+        n = self.num_assets
+        return V[:n] + V[n] + self.group_matrix.T @ V[n + 1:]
+
+    def _factor(self, rho: np.ndarray):
+        """Diagonal and inverse Woodbury matrices of K(rho) for each step size"""
+        D = self.eigenvalues[:, None] + self.sigma + rho
+        S = np.einsum('ik,im,il->mkl', self.B_rotated, 1 / D, self.B_rotated)
+        S += np.diag(1 / self.row_weights[self.num_assets:]) / rho[:, None, None]
+        return D, np.linalg.inv(S)
+
+    def _system_solve(self, rhs: np.ndarray, D: np.ndarray, S_inv: np.ndarray) -> np.ndarray:
+        """K(rho)^-1 @ rhs, column j using step size rho[j]"""
+        r = (self.Q.T @ rhs) / D
+        t = np.einsum('mkl,lm->km', S_inv, self.B_rotated.T @ r)
+        return self.Q @ (r - (self.B_rotated @ t) / D)
+
+    def _solve(
+        self,
+        q: np.ndarray,
+        initial_weights: Optional[np.ndarray],
+        max_iterations: int
+    ) -> Dict[str, Any]:
+        """
+        Run ADMM on the (n, m) matrix of linear terms q, one problem per column.
+
+        Columns leave the batch as soon as they meet the tolerance and are then
+        polished, so the remaining iterations only pay for unfinished problems.
+        """
+        n, m = q.shape
+        weights = np.empty((n, m))
+        iterations = np.full(m, max_iterations)
+        converged = np.zeros(m, dtype=bool)
+        polished = np.zeros(m, dtype=bool)
+
+        row_weights = self.row_weights[:, None]
+        lower, upper = self.lower[:, None], self.upper[:, None]
+        active = np.arange(m)
+        rho = np.full(m, self.rho)
+        if initial_weights is None:
+            x = np.full((n, m), 1.0 / n)
+        else:
+            x = np.repeat(np.asarray(initial_weights, dtype=np.float64).reshape(n, 1), m, axis=1)
+        z = np.clip(self._apply(x), lower, upper)
+        y = np.zeros_like(z)
+        D, S_inv = self._factor(rho)
+
+        for iteration in range(1, max_iterations + 1):
+            q_active = q[:, active]
+            rho_rows = row_weights * rho
+            rhs = self.sigma * x - q_active + self._apply_t(rho_rows * z - y)
+            x_tilde = self._system_solve(rhs, D, S_inv)
+            z_tilde = self._apply(x_tilde)
+
+            x = self.alpha * x_tilde + (1 - self.alpha) * x
+            z_relaxed = self.alpha * z_tilde + (1 - self.alpha) * z
+            z_next = np.clip(z_relaxed + y / rho_rows, lower, upper)
+            y += rho_rows * (z_relaxed - z_next)
+            z = z_next
+
+            if iteration % CHECK_EVERY and iteration != max_iterations:
+                continue
+
+            Ax = self._apply(x)
+            Px = self.P @ x
+            Aty = self._apply_t(y)
+            primal = np.abs(Ax - z).max(axis=0)
+            dual = np.abs(Px + q_active + Aty).max(axis=0)
+            primal_scale = np.maximum(np.abs(Ax).max(axis=0), np.abs(z).max(axis=0))
+            dual_scale = np.maximum.reduce(
+                [np.abs(Px).max(axis=0), np.abs(Aty).max(axis=0), np.abs(q_active).max(axis=0)]
+            )
+            done = (primal <= self.eps_abs + self.eps_rel * primal_scale) & \
+                (dual <= self.eps_abs + self.eps_rel * dual_scale)
+            converged[active] = done
+            final = iteration == max_iterations
+            # Unfinished problems close to the tolerance also try an early polish
+            attempt = done | final
+            if iteration % POLISH_EVERY == 0:
+                attempt |= (primal <= 100 * (self.eps_abs + self.eps_rel * primal_scale)) & \
+                    (dual <= 100 * (self.eps_abs + self.eps_rel * dual_scale))
+
+            for j in np.flatnonzero(attempt):
+                column = active[j]
+                refined = self._polish(z[:, j], y[:, j], q[:, column])
+                if refined is not None:
+                    weights[:, column] = refined
+                    polished[column] = converged[column] = done[j] = True
+                elif done[j] or final:
+                    weights[:, column] = np.clip(x[:, j], self.lower[:n], self.upper[:n])
+                    done[j] = True
+                if done[j]:
+                    iterations[column] = iteration
+
+            keep = ~done
+            if not keep.any():
+                break
+            active, x, z, y, rho = active[keep], x[:, keep], z[:, keep], y[:, keep], rho[keep]
+            D, S_inv = D[:, keep], S_inv[keep]
+            primal, dual = primal[keep], dual[keep]
+            primal_scale, dual_scale = primal_scale[keep], dual_scale[keep]
+
+            # OSQP's rule: rescale the step to balance the relative primal and dual residuals
+            ratio = np.sqrt(
+                (primal / np.maximum(primal_scale, 1e-12)) / np.maximum(dual / np.maximum(dual_scale, 1e-12), 1e-12)
+            )
+            adapt = (ratio > 5) | (ratio < 0.2)
+            if adapt.any():
+                rho = np.where(adapt, np.clip(rho * ratio, 1e-6, 1e6), rho)
+                D, S_inv = self._factor(rho)
+
+        return {
+            'weights': weights,
+            'converged': converged,
+            'polished': polished,
+            'iterations': iterations
+        }
+
+    def _polish(self, z: np.ndarray, y: np.ndarray, q: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Exact solution refined from an ADMM iterate, or None.
+
+        Constraints the iterate holds at a bound become equalities and the
+        reduced KKT system is solved directly. The guess is then repaired with
+        primal-dual active-set steps (violated constraints become active,
+        active ones with wrong-signed multipliers are released) until the
+        solution is feasible with correctly signed multipliers, i.e. optimal.
+        """
+        n = self.num_assets
+        tol = 1e-9
+        equal = self.lower == self.upper
+        at_lower = (z - self.lower < -y) | equal
+        at_upper = (self.upper - z < y) & ~at_lower
+        rows = np.vstack([np.ones((1, n)), self.group_matrix])
+
+        for _ in range(POLISH_STEPS):
+            fixed = at_lower[:n] | at_upper[:n]
+            free = ~fixed
+            x = np.where(at_lower[:n], self.lower[:n], self.upper[:n]) * fixed
+
+            row_active = at_lower[n:] | at_upper[n:]
+            C = rows[row_active]
+            bounds = np.where(at_lower[n:], self.lower[n:], self.upper[n:])[row_active]
+
+            num_free, num_rows = int(free.sum()), C.shape[0]
+            kkt = np.zeros((num_free + num_rows, num_free + num_rows))
+            kkt[:num_free, :num_free] = self.P[np.ix_(free, free)]
+            kkt[:num_free, num_free:] = C[:, free].T
+            kkt[num_free:, :num_free] = C[:, free]
+            rhs = np.concatenate([-q[free] - self.P[np.ix_(free, fixed)] @ x[fixed], bounds - C[:, fixed] @ x[fixed]])
+            try:
+                solution = np.linalg.solve(kkt, rhs)
+            except np.linalg.LinAlgError:
+                # Degenerate active set (e.g. every member of a group at a bound):
+                # the multipliers are not unique, take the least-norm ones
+                solution = np.linalg.lstsq(kkt, rhs, rcond=None)[0]
+                if not np.allclose(kkt @ solution, rhs, atol=1e-9):
+                    return None
+            x[free] = solution[:num_free]
+
+            # Multipliers in OSQP's convention: <= 0 at a lower bound, >= 0 at an upper bound
+            multipliers = np.zeros(len(self.lower))
+            multipliers[n:][row_active] = solution[num_free:]
+            multipliers[:n][fixed] = -(self.P @ x + q + C.T @ solution[num_free:])[fixed]
+
+            values = np.concatenate([x, rows @ x])
+            below = ~(at_lower | at_upper) & (values < self.lower - tol)
+            above = ~(at_lower | at_upper) & (values > self.upper + tol)
+            release_lower = at_lower & ~equal & (multipliers > tol)
+            release_upper = at_upper & (multipliers < -tol)
+            if not (below.any() or above.any() or release_lower.any() or release_upper.any()):
+                return x
+
+            at_lower = (at_lower & ~release_lower) | below
+            at_upper = (at_upper & ~release_upper) | above
+        return None
+
+    def solve(
+        self,
+        expected_returns: Optional[np.ndarray] = None,
+        risk_tolerance: float = 0.0,
+        initial_weights: Optional[np.ndarray] = None,
+        max_iterations: int = DEFAULT_MAX_ITERATIONS
+    ) -> Dict[str, Any]:
+        """
+        Optimal weights for one risk tolerance.
+
+        Args:
+            expected_returns: (n,) expected returns in the covariance's units;
+                omitted (or ``risk_tolerance=0``) gives the minimum-variance portfolio.
+            risk_tolerance: Weight ``t`` of expected return against half the variance.
+            initial_weights: Warm start, typically the current holdings.
+            max_iterations: ADMM iteration cap.
+
+        Returns:
+            Dictionary with ``weights`` (n,), ``expected_return``, ``volatility``
+            and solver diagnostics (``converged``, ``polished``, ``iterations``).
+        """
+        q = np.zeros((self.num_assets, 1))
+        if expected_returns is not None and risk_tolerance:
+            q[:, 0] = -risk_tolerance * np.asarray(expected_returns, dtype=np.float64) / self.scale
+
+        result = self._solve(q, initial_weights, max_iterations)
+        weights = result['weights'][:, 0]
+        result['weights'] = weights
+        for key in ('converged', 'polished', 'iterations'):
+            result[key] = result[key][0].item()
+        result.update(self._portfolio_moments(weights[:, None], expected_returns))
+        result['expected_return'] = result['expected_return'][0]
+        result['volatility'] = result['volatility'][0]
+        return result
+
+    def efficient_frontier(
+        self,
+        expected_returns: np.ndarray,
+        num_points: int = 100,
+        risk_tolerances: Optional[np.ndarray] = None,
+        initial_weights: Optional[np.ndarray] = None,
+        max_iterations: int = DEFAULT_MAX_ITERATIONS
+    ) -> Dict[str, Any]:
+        """
+        Trace the efficient frontier in one batched solve.
+
+        By default the risk tolerances run from 0 (minimum variance) up to a
+        value where the expected-return term dominates, spaced geometrically.
+
+        Returns:
+            Dictionary with ``risk_tolerance`` (points,), ``weights``
+            (points, n), ``expected_return`` and ``volatility`` (points,) and
+            per-point solver diagnostics.
+        """
+        expected_returns = np.asarray(expected_returns, dtype=np.float64)
+        if risk_tolerances is None:
+            spread = float(np.ptp(expected_returns)) or 1.0
+            risk_tolerances = np.concatenate([[0.0], np.geomspace(1e-3, 1e1, num_points - 1)]) * self.scale / spread
+        risk_tolerances = np.asarray(risk_tolerances, dtype=np.float64)
+
+        q = -np.outer(expected_returns / self.scale, risk_tolerances)
+        result = self._solve(q, initial_weights, max_iterations)
+        result['risk_tolerance'] = risk_tolerances
+        result.update(self._portfolio_moments(result['weights'], expected_returns))
+        result['weights'] = result['weights'].T
+        return result
+
+    def _portfolio_moments(self, weights: np.ndarray, expected_returns: Optional[np.ndarray]) -> Dict[str, Any]:
+        """Expected return and volatility of each weight column, in the input units"""
+        variance = np.einsum('im,im->m', weights, (self.P * self.scale) @ weights)
+        expected_return = (
+            np.asarray(expected_returns, dtype=np.float64) @ weights
+            if expected_returns is not None else np.full(weights.shape[1], np.nan)
+        )
+        return {'expected_return': expected_return, 'volatility': np.sqrt(np.maximum(variance, 0.0))}
+
+
+def optimize_holdings(
+    portfolio_manager,
+    covariance: Optional[np.ndarray] = None,
+    expected_returns: Optional[np.ndarray] = None,
+    risk_tolerance: float = 0.0,
+    max_weight: float = 1.0,
+    class_bounds: Optional[Dict[str, Tuple[float, float]]] = None,
+    region_bounds: Optional[Dict[str, Tuple[float, float]]] = None
+) -> Dict[str, Any]:
+    """
+    Optimize the holdings of a ``PortfolioManager``.
+
+    The covariance defaults to the recorded return history
+    (``return_covariance``) and otherwise to the asset class assumptions in
+    ``scenario_analysis``. The solve is warm-started from the current weights.
+
+    Args:
+        portfolio_manager: Portfolio whose holdings are optimized.
+        covariance, expected_returns: Optional inputs in frame order.
+        risk_tolerance: 0 for the minimum-variance portfolio.
+        max_weight: Upper bound on each holding's weight (fraction).
+        class_bounds, region_bounds: Allocation ranges in percent per asset
+            class / region, e.g. ``{'crypto': (0, 5)}``.
+
+    Returns:
+        Dictionary with holding ``weights`` and ``asset_allocation`` /
+        ``geographic_allocation`` in percent, the expected ``volatility`` and
+        the solver diagnostics.
+    """
+    frame = portfolio_manager.portfolio.assets
+    if covariance is None:
+        history = portfolio_manager.return_covariance()
+        if history is not None:
+            mean, covariance = history
+            if expected_returns is None:
+                expected_returns = mean
+        else:
+            from scripts.scenario_analysis import ASSET_CLASS_ASSUMPTIONS, default_covariance
+            covariance = default_covariance(list(frame))
+            if expected_returns is None:
+                expected_returns = np.array([
+                    ASSET_CLASS_ASSUMPTIONS[asset.asset_type]['return'] for asset in frame
+                ])
+
+    groups: List[Tuple[np.ndarray, float, float]] = []
+    for by, bounds in (('asset_type', class_bounds), ('region', region_bounds)):
+        categories = getattr(frame, f"{by}_categories")
+        codes = getattr(frame, f"{by}_code")
+        for label, (low, high) in (bounds or {}).items():
+            if label in categories:
+                groups.append((codes == categories.index(label), low / 100, high / 100))
+
+    optimizer = PortfolioOptimizer(covariance, upper=max_weight, groups=groups)
+    result = optimizer.solve(
+        expected_returns, risk_tolerance, initial_weights=frame.allocation / frame.allocation.sum()
+    )
+
+    weights = result['weights'] * 100
+    allocations = {}
+    for by in ('asset_type', 'region'):
+        categories = getattr(frame, f"{by}_categories")
+        totals = np.bincount(getattr(frame, f"{by}_code"), weights=weights, minlength=len(categories))
+        allocations[by] = dict(zip(categories, totals.tolist()))
+
+    return {
+        'weights': dict(zip(frame.symbol.tolist(), weights.tolist())),
+        'asset_allocation': allocations['asset_type'],
+        'geographic_allocation': allocations['region'],
+        'expected_return': float(result['expected_return']),
+        'volatility': float(result['volatility']),
+        'converged': result['converged'],
+        'iterations': result['iterations']
+    }
@@ -0,0 +1,292 @@
+"""
+Local on-disk store of daily closing prices.
+
+Prices live in one date-major float64 matrix (``close.f8``, one row per
+trading day, one column per symbol) next to a matching vector of dates
+(``dates.M8``) and a small ``manifest.json`` holding the symbol -> column
+index. Both data files are opened with ``np.memmap``, so a date range is a
+contiguous, zero-copy slice of rows and only the pages a caller touches are
+read from disk. Days are appended at the end of the files; missing prices
+are NaN.
+"""
+
+import datetime
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'prices')
+MANIFEST = 'manifest.json'
+PRICES_FILE = 'close.f8'
+DATES_FILE = 'dates.M8'
+ROW_GROWTH = 256  # days reserved on disk each time the files grow
+
+DateLike = Union[str, np.datetime64, datetime.date]
+
+
+def _to_day(date: DateLike) -> np.datetime64:
+    return np.datetime64(date, 'D')
+
+
+class PriceStore:
+    """
+    Append-only memory-mapped price history.
+
+    Args:
+        root: Directory holding the store; created on first write.
+        read_only: Open the files read-only (appends raise).
+        symbol_capacity: Columns reserved when a new store is created. Adding
+            symbols beyond the capacity rewrites the matrix with twice as many.
+    """
+
+    def __init__(self, root: str = DEFAULT_ROOT, read_only: bool = False, symbol_capacity: int = 64):
+        self.root = root
+        self.read_only = read_only
+        manifest_path = os.path.join(root, MANIFEST)
+
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        elif read_only:
+            raise FileNotFoundError(f"No price store at {root}")
+        else:
+            os.makedirs(root, exist_ok=True)
+            manifest = {'symbols': [], 'symbol_capacity': symbol_capacity, 'num_days': 0, 'row_capacity': 0}
+
+        self.symbols: List[str] = manifest['symbols']
+        self.index: Dict[str, int] = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.symbol_capacity: int = manifest['symbol_capacity']
+        self.num_days: int = manifest['num_days']
+        self.row_capacity: int = manifest['row_capacity']
+        self._map()
+
+    # ------------------------------------------------------------------ files
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _map(self) -> None:
+        """(Re)open the memory maps at the current capacities"""
+        if self.row_capacity == 0:
+            self._prices = np.empty((0, self.symbol_capacity))
+            self._dates = np.empty(0, dtype='datetime64[D]')
+            return
+
+        mode = 'r' if self.read_only else 'r+'
+        self._prices = np.memmap(
+            self._path(PRICES_FILE), dtype=np.float64, mode=mode,
+            shape=(self.row_capacity, self.symbol_capacity)
+        )
+        self._dates = np.memmap(self._path(DATES_FILE), dtype='datetime64[D]', mode=mode, shape=(self.row_capacity,))
+
+    def _write_manifest(self) -> None:
+        """Atomically replace the manifest; it is written after the data it describes"""
+        manifest = {
+            'symbols': self.symbols,
+            'symbol_capacity': self.symbol_capacity,
+            'num_days': self.num_days,
+            'row_capacity': self.row_capacity
+        }
+        tmp_path = self._path(MANIFEST + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._path(MANIFEST))
+
+    def _reserve_rows(self, num_days: int) -> None:
+        """Grow the files (in ROW_GROWTH steps) so they hold at least num_days rows"""
+        if num_days <= self.row_capacity:
+            return
+
+        row_capacity = -(-num_days // ROW_GROWTH) * ROW_GROWTH
+        self.flush()
+        # Date-major layout: growing only extends the files, existing rows never move
+        with open(self._path(PRICES_FILE), 'ab') as f:
+            f.truncate(row_capacity * self.symbol_capacity * 8)
+        with open(self._path(DATES_FILE), 'ab') as f:
+            f.truncate(row_capacity * 8)
+
+        self._prices_fill(self.row_capacity, row_capacity)
+        self.row_capacity = row_capacity
+        self._map()
+
+    def _prices_fill(self, start: int, stop: int) -> None:
+        """Initialize newly reserved rows to NaN (truncate zero-fills)"""
+        prices = np.memmap(
+            self._path(PRICES_FILE), dtype=np.float64, mode='r+',
+            shape=(stop, self.symbol_capacity)
+        )
+        prices[start:stop] = np.nan
+        prices.flush()
+
+    def _reserve_symbols(self, num_symbols: int) -> None:
+        """Rewrite the matrix with more columns once the symbol capacity is exhausted"""
+        if num_symbols <= self.symbol_capacity:
+            return
+
+        symbol_capacity = self.symbol_capacity
+        while symbol_capacity < num_symbols:
+            symbol_capacity *= 2
+
+        if self.row_capacity:
+            tmp_path = self._path(PRICES_FILE + '.tmp')
+            widened = np.memmap(tmp_path, dtype=np.float64, mode='w+', shape=(self.row_capacity, symbol_capacity))
+            widened[:, self.symbol_capacity:] = np.nan
+            widened[:, :self.symbol_capacity] = self._prices
+            widened.flush()
+            del widened
+            self._prices = None
+            os.replace(tmp_path, self._path(PRICES_FILE))
+
+        self.symbol_capacity = symbol_capacity
+        self._map()
+
+    def _columns(self, symbols: Iterable[str]) -> np.ndarray:
+        """Column indices for symbols, registering unseen ones"""
+        new_symbols = [s for s in dict.fromkeys(symbols) if s not in self.index]
+        if new_symbols:
+            self._reserve_symbols(len(self.symbols) + len(new_symbols))
+            for symbol in new_symbols:
+                self.index[symbol] = len(self.symbols)
+                self.symbols.append(symbol)
+        return np.array([self.index[s] for s in symbols], dtype=np.intp)
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise PermissionError("PriceStore was opened read-only")
+
+    # ----------------------------------------------------------------- writes
+
+    def append(self, date: DateLike, prices: Dict[str, float]) -> None:
+        """
+        Record one day of closing prices.
+
+        Dates must not go backwards; appending the last stored date again
+        updates that day's row in place (e.g. for an intraday refresh).
+        """
+        self._check_writable()
+        day = _to_day(date)
+        if self.num_days and day < self._dates[self.num_days - 1]:
+            raise ValueError(f"Cannot append {day}: store already ends at {self._dates[self.num_days - 1]}")
+
+        columns = self._columns(prices.keys())
+        if self.num_days and day == self._dates[self.num_days - 1]:
+            row = self.num_days - 1
+        else:
+            self._reserve_rows(self.num_days + 1)
+            row = self.num_days
+            self._dates[row] = day
+            self.num_days += 1
+
+        self._prices[row, columns] = np.fromiter(prices.values(), dtype=np.float64, count=len(columns))
+        self.flush()
+        self._write_manifest()
+
+    def append_block(self, dates: Sequence[DateLike], symbols: Sequence[str], prices: np.ndarray) -> None:
+        """
+        Bulk-append a (days, symbols) block of prices for strictly increasing dates
+        after the last stored day.
+        """
+        self._check_writable()
+        days = np.asarray(dates, dtype='datetime64[D]')
+        prices = np.asarray(prices, dtype=np.float64)
+        if prices.shape != (len(days), len(symbols)):
+            raise ValueError(f"Expected prices of shape {(len(days), len(symbols))}, got {prices.shape}")
+        if len(days) == 0:
+            return
+        if np.any(np.diff(days) <= np.timedelta64(0, 'D')):
+            raise ValueError("Block dates must be strictly increasing")
+        if self.num_days and days[0] <= self._dates[self.num_days - 1]:
+            raise ValueError(f"Block starts at {days[0]}, store already ends at {self._dates[self.num_days - 1]}")
+
+        columns = self._columns(symbols)
+        start, stop = self.num_days, self.num_days + len(days)
+        self._reserve_rows(stop)
+
+        self._dates[start:stop] = days
+        self._prices[start:stop, columns] = prices
+        self.num_days = stop
+        self.flush()
+        self._write_manifest()
+
+    def ingest_yfinance(self, symbols: Sequence[str], start: DateLike, end: Optional[DateLike] = None) -> int:
+        """
+        Download daily closes with yfinance and append the days after the last
+        stored date. Returns the number of days added.
+        """
+        import yfinance as yf
+
+        if self.num_days:
+            start = max(_to_day(start), self._dates[self.num_days - 1] + np.timedelta64(1, 'D'))
+        data = yf.download(
+            list(symbols), start=str(start), end=None if end is None else str(_to_day(end)),
+            auto_adjust=True, progress=False
+        )
+        if data.empty:
+            return 0
+
+        closes = data['Close']
+        if closes.ndim == 1:
+            closes = closes.to_frame(symbols[0])
+        closes = closes.reindex(columns=list(symbols))
+        self.append_block(closes.index.values.astype('datetime64[D]'), list(closes.columns), closes.to_numpy())
+        return len(closes)
+
+    def flush(self) -> None:
+        if isinstance(self._prices, np.memmap) and not self.read_only:
+            self._prices.flush()
+            self._dates.flush()
+
+    # ------------------------------------------------------------------ reads
+
+    def __len__(self) -> int:
+        return self.num_days
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.index
+
+    @property
+    def dates(self) -> np.ndarray:
+        """Stored trading days (zero-copy view)"""
+        return self._dates[:self.num_days]
+
+    def _rows(self, start: Optional[DateLike], end: Optional[DateLike]) -> slice:
+        """Row slice for the inclusive date range [start, end]"""
+        dates = self.dates
+        first = 0 if start is None else int(np.searchsorted(dates, _to_day(start), side='left'))
+        last = self.num_days if end is None else int(np.searchsorted(dates, _to_day(end), side='right'))
+        return slice(first, max(first, last))
+
+    def window(
+        self,
+        start: Optional[DateLike] = None,
+        end: Optional[DateLike] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Dates and prices for the inclusive date range [start, end].
+
+        Returns:
+            Tuple of (dates, prices) zero-copy views; ``prices`` has one column
+            per entry of ``symbols``.
+        """
+        rows = self._rows(start, end)
+        return self._dates[rows], self._prices[rows, :len(self.symbols)]
+
+    def column(self, symbol: str, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> np.ndarray:
+        """Price history of one symbol over [start, end] (zero-copy, strided view)"""
+        if symbol not in self.index:
+            raise KeyError(f"Unknown symbol: {symbol}")
+        return self._prices[self._rows(start, end), self.index[symbol]]
+
+    def prices(
+        self,
+        symbols: Sequence[str],
+        start: Optional[DateLike] = None,
+        end: Optional[DateLike] = None
+    ) -> np.ndarray:
+        """(days, len(symbols)) prices for a subset of symbols; a copy, since columns are gathered"""
+        missing = [s for s in symbols if s not in self.index]
+        if missing:
+            raise KeyError(f"Unknown symbols: {missing}")
+        return self._prices[self._rows(start, end)][:, [self.index[s] for s in symbols]]
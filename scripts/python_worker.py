@@ -0,0 +1,285 @@
+"""
+Long-lived Python worker for the Next.js API routes.
+
+Speaks length-prefixed JSON-RPC over stdin/stdout: every message is a 4-byte
+big-endian length followed by that many bytes of UTF-8 JSON.
+
+    request:  {"id": 1, "method": "portfolio", "params": {}}
+    response: {"id": 1, "result": ...} or {"id": 1, "error": {"type": ..., "message": ...}}
+
+Streaming methods return a generator; each item is sent as soon as it is
+produced as a delta frame, {"id": 1, "delta": "..."}, before the final
+result (or error) frame that ends the call. A {"id": 1, "cancel": true}
+frame received meanwhile (the client went away) closes the generator, and
+the call ends with what was produced so far and "cancelled": true.
+
+The interpreter, numpy/pandas and the portfolio objects are loaded once at
+startup, so each request only pays for the work it asks for. Anything the
+analysis code prints goes to stderr to keep stdout reserved for frames.
+"""
+
+import asyncio
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+import traceback
+import types
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional
+
+# Modules are imported through the ``scripts`` package only, so each one is
+# loaded once per worker; make the package importable when run as a script
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SCRIPTS_DIR))
+
+import numpy as np
+
+from scripts.portfolio_manager import PortfolioManager
+from scripts.risk_profiler import RiskProfiler
+from scripts.scenario_analysis import ScenarioAnalyzer
+
+HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+# Daily return history, saved after each recorded bar and restored at startup
+RETURN_HISTORY_PATH = os.getenv(
+    "RETURN_HISTORY_PATH", os.path.join(os.path.dirname(SCRIPTS_DIR), "data", "return_history.npz")
+)
+
+
+class RawJSON(str):
+    """Result that is already serialized JSON and is embedded without re-encoding"""
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize numpy scalars and arrays returned by the analysis code"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def read_frame(stream: BinaryIO) -> Optional[Dict[str, Any]]:
+    """Read one request frame; returns None on a clean end of input"""
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+
+    (length,) = HEADER.unpack(header)
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return json.loads(payload)
+
+
+def write_frame(
+    stream: BinaryIO,
+    request_id: Any,
+    result: Any = None,
+    error: Optional[Dict] = None,
+    delta: Optional[str] = None
+) -> None:
+    """Write one response (or delta) frame"""
+    if delta is not None:
+        body = json.dumps({"id": request_id, "delta": delta})
+    elif error is not None:
+        body = json.dumps({"id": request_id, "error": error})
+    elif isinstance(result, RawJSON):
+        body = '{"id": %s, "result": %s}' % (json.dumps(request_id), result)
+    else:
+        body = json.dumps({"id": request_id, "result": result}, default=_json_default)
+
+    payload = body.encode("utf-8")
+    stream.write(HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+class PortfolioWorker:
+    """Warm analysis objects and the JSON-RPC method table"""
+
+    def __init__(self):
+        self.portfolio_manager = PortfolioManager()
+        if os.path.exists(RETURN_HISTORY_PATH):
+            self.portfolio_manager.restore_return_history(RETURN_HISTORY_PATH)
+        # One portfolio for every method (scenarios and the advisors' prompts),
+        # so recorded returns reach all of their risk figures
+        self.scenario_analyzer = ScenarioAnalyzer(portfolio_manager=self.portfolio_manager)
+        self.risk_profiler = RiskProfiler()
+        self._advisor = None
+        self._async_advisor = None
+        # One loop for the worker's lifetime keeps the async client's connections alive
+        self._loop = asyncio.new_event_loop()
+
+        self.methods: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "ping": lambda params: {"pid": os.getpid()},
+            "portfolio": self.portfolio,
+            "scenario": self.scenario,
+            "risk_profile": self.risk_profile,
+            "record_returns": self.record_returns,
+            "analyze": self.analyze,
+            "chat": self.chat,
+            "chat_stream": self.chat_stream,
+            "report": self.report,
+            "llm_cache_stats": lambda params: self.advisor.response_cache.stats(),
+            "llm_scheduler_stats": lambda params: self.advisor.scheduler.stats(),
+        }
+
+    @property
+    def advisor(self):
+        """AI advisor, created on first use since it requires GROQ_API_KEY"""
+        if self._advisor is None:
+            from scripts.ai_portfolio_advisor import AIPortfolioAdvisor
+            self._advisor = AIPortfolioAdvisor(portfolio_manager=self.portfolio_manager)
+        return self._advisor
+
+    @property
+    def async_advisor(self):
+        """Async AI advisor for concurrent requests, created on first use"""
+        if self._async_advisor is None:
+            from scripts.ai_portfolio_advisor import AsyncAIPortfolioAdvisor
+            self._async_advisor = AsyncAIPortfolioAdvisor(portfolio_manager=self.portfolio_manager)
+        return self._async_advisor
+
+    def portfolio(self, params: Dict[str, Any]) -> RawJSON:
+        return RawJSON(self.portfolio_manager.to_json())
+
+    def scenario(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        analyzer = self.scenario_analyzer
+        monte_carlo = analyzer.monte_carlo_simulation(
+            num_simulations=params.get("num_simulations", 1000),
+            time_horizon=params.get("time_horizon", 252),
+            seed=params.get("seed")
+        )
+        return {
+            "monte_carlo": monte_carlo["statistics"],
+            "interest_rate_scenarios": analyzer.interest_rate_scenarios(),
+            "risk_analysis": analyzer.risk_analysis(seed=params.get("seed")),
+        }
+
+    def record_returns(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a bar of daily returns (percent, per symbol) and persist the history"""
+        self.portfolio_manager.record_returns(params["returns"])
+        os.makedirs(os.path.dirname(os.path.abspath(RETURN_HISTORY_PATH)), exist_ok=True)
+        self.portfolio_manager.save_return_history(RETURN_HISTORY_PATH)
+        return {"bars": self.portfolio_manager.return_estimator.count}
+
+    def risk_profile(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        answers = {int(k): str(v) for k, v in params.get("answers", {}).items()}
+        profile = self.risk_profiler.determine_risk_profile(answers)
+        return {
+            "risk_score": self.risk_profiler.calculate_risk_score(answers),
+            "risk_profile": profile.name,
+            "description": profile.description,
+            "recommendations": self.risk_profiler.get_personalized_recommendations(profile),
+        }
+
+    def analyze(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"analysis": self.advisor.get_portfolio_analysis(params.get("analysis_type", "comprehensive"))}
+
+    def report(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        report = self._loop.run_until_complete(self.async_advisor.full_report(
+            target_allocation=params.get("target_allocation"),
+            analysis_type=params.get("analysis_type", "comprehensive"),
+        ))
+        return {"report": report}
+
+    def chat(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.advisor.chat_with_advisor(
+            params["message"], params.get("conversation_history") or [], params.get("session_id")
+        )
+        return {"response": response}
+
+    def chat_stream(self, params: Dict[str, Any]) -> Iterator[str]:
+        """Yield response deltas as they arrive from Groq"""
+        return self.advisor.stream_chat_response(
+            params["message"], params.get("conversation_history") or [], params.get("session_id")
+        )
+
+    def handle(self, request: Dict[str, Any]) -> Any:
+        method = self.methods.get(request.get("method"))
+        if method is None:
+            raise ValueError(f"Unknown method: {request.get('method')}")
+        return method(request.get("params") or {})
+
+
+def _read_frames(stdin: BinaryIO, frames: "queue.Queue") -> None:
+    """Reader thread: queue every incoming frame, then None at end of input"""
+    try:
+        while True:
+            frame = read_frame(stdin)
+            frames.put(frame)
+            if frame is None:
+                return
+    except Exception:
+        traceback.print_exc(file=sys.stderr)
+        frames.put(None)
+
+
+def _cancel_requested(frames: "queue.Queue", backlog: List[Optional[Dict]], request_id: Any) -> bool:
+    """Whether a cancel frame for the running call has arrived; other frames are kept for later"""
+    cancelled = False
+    while True:
+        try:
+            frame = frames.get_nowait()
+        except queue.Empty:
+            return cancelled
+        if frame is not None and frame.get("cancel"):
+            cancelled = cancelled or frame.get("id") == request_id
+        else:
+            backlog.append(frame)
+
+
+def serve(stdin: BinaryIO, stdout: BinaryIO) -> None:
+    """Handle requests one at a time until stdin closes"""
+    worker = PortfolioWorker()
+    # Frames are read on a thread so a cancel can arrive while a call streams
+    frames: "queue.Queue" = queue.Queue()
+    backlog: List[Optional[Dict]] = []
+    threading.Thread(target=_read_frames, args=(stdin, frames), daemon=True).start()
+    write_frame(stdout, None, {"ready": True, "pid": os.getpid()})
+
+    while True:
+        request = backlog.pop(0) if backlog else frames.get()
+        if request is None:
+            return
+        if request.get("cancel"):
+            # The call finished before the cancel arrived
+            continue
+
+        request_id = request.get("id")
+        try:
+            result = worker.handle(request)
+            if isinstance(result, types.GeneratorType):
+                deltas = []
+                cancelled = False
+                for delta in result:
+                    write_frame(stdout, request_id, delta=delta)
+                    deltas.append(delta)
+                    if _cancel_requested(frames, backlog, request_id):
+                        # Closing the generator closes the upstream Groq stream
+                        result.close()
+                        cancelled = True
+                        break
+                result = {"response": "".join(deltas)}
+                if cancelled:
+                    result["cancelled"] = True
+            write_frame(stdout, request_id, result)
+        except Exception as e:
+            traceback.print_exc(file=sys.stderr)
+            write_frame(stdout, request_id, error={"type": type(e).__name__, "message": str(e)})
+
+
+def main():
+    """Entry point: reserve the real stdout for protocol frames"""
+    protocol_out = sys.stdout.buffer
+    sys.stdout = sys.stderr
+    serve(sys.stdin.buffer, protocol_out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Holding-level rebalancing with transaction costs.
+
+Turns a target allocation (per asset class or per holding) into a list of
+concrete trades: drift inside a no-trade band is left alone, share counts are
+rounded to whole lots at ``current_price``, trades below a minimum size are
+dropped and every trade pays a proportional plus a fixed cost. Cash holdings
+fund the buys and receive the sales; buys are scaled down so that cash never
+goes negative. All steps are array operations over the holdings, so the plan
+for tens of thousands of lines costs a few milliseconds.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Labels the LLM and users tend to use for the asset classes
+ASSET_CLASS_ALIASES = {
+    'stocks': 'stock',
+    'equity': 'stock',
+    'equities': 'stock',
+    'bonds': 'bond',
+    'fixed income': 'bond',
+    'cryptos': 'crypto',
+    'cryptocurrency': 'crypto',
+    'cryptocurrencies': 'crypto',
+}
+
+
+@dataclass
+class TradingCosts:
+    """Cost model and trading rules for a rebalance"""
+    proportional: float = 0.001  # fraction of traded value (10 bps)
+    fixed: float = 1.0  # per trade, in portfolio currency
+    min_trade_value: float = 100.0
+    # No-trade band around each holding's target: the tighter of an absolute
+    # band in percentage points and a band relative to the target weight
+    band: float = 1.0
+    relative_band: float = 0.2
+    lot_sizes: Dict[str, float] = field(default_factory=lambda: {'crypto': 0.0001})
+    default_lot_size: float = 1.0
+
+
+def normalize_allocation(allocation: Dict[str, float]) -> Dict[str, float]:
+    """Map free-form asset class labels ("Stocks", "bonds", ...) to the portfolio's asset types"""
+    normalized: Dict[str, float] = {}
+    for label, value in allocation.items():
+        key = str(label).strip().lower()
+        key = ASSET_CLASS_ALIASES.get(key, key)
+        normalized[key] = normalized.get(key, 0.0) + float(str(value).replace('%', ''))
+    return normalized
+
+
+def holding_targets(frame, class_targets: Dict[str, float]) -> np.ndarray:
+    """
+    Per-holding target weights (percent) for an asset class allocation.
+
+    Each class target is split across the holdings of that class in
+    proportion to their current values (equally if the class is empty of
+    value). Targets for classes the portfolio does not hold are dropped and
+    the remaining targets are rescaled to 100%.
+    """
+    categories = frame.asset_type_categories
+    codes = frame.asset_type_code
+    counts = np.bincount(codes, minlength=len(categories))
+    class_values = np.bincount(codes, weights=frame.value, minlength=len(categories))
+
+    targets = np.array([class_targets.get(label, 0.0) for label in categories], dtype=np.float64)
+    targets[counts == 0] = 0.0
+    if targets.sum() <= 0:
+        raise ValueError("Target allocation does not cover any asset class held in the portfolio")
+    targets *= 100 / targets.sum()
+
+    share = np.divide(
+        frame.value, class_values[codes], out=1.0 / counts[codes], where=class_values[codes] > 0
+    )
+    return targets[codes] * share
+
+
+def plan_trades(
+    frame,
+    target_weights: np.ndarray,
+    costs: Optional[TradingCosts] = None,
+    to_band_edge: bool = False
+) -> Dict[str, Any]:
+    """
+    Trades that move a ``PortfolioFrame`` towards per-holding target weights.
+
+    Args:
+        frame: Current holdings (values and prices are read, not modified).
+        target_weights: (n,) target weight of each holding in percent.
+        costs: Cost model; defaults to ``TradingCosts()``.
+        to_band_edge: Trade drifted holdings only back to the edge of the
+            no-trade band instead of all the way to target (less turnover).
+
+    Returns:
+        Dictionary with the ``trades`` list, total ``turnover`` and ``cost``,
+        the ``cash_change`` booked on the cash holding, the ``unbooked_cash``
+        left over when there is no cash holding to book it on (net sale
+        proceeds after costs; it leaves the portfolio's total value) and the
+        post-trade weights (``post_trade_weights``, percent, in frame order).
+    """
+    costs = costs or TradingCosts()
+    values = frame.value
+    prices = frame.current_price
+    total_value = float(values.sum())
+    if total_value <= 0:
+        raise ValueError("Portfolio has no value to rebalance")
+
+    cash_row = _cash_row(frame)
+    is_cash = frame.asset_type_code == (
+        frame.asset_type_categories.index('cash') if cash_row is not None else -1
+    )
+    lot_table = np.array(
+        [costs.lot_sizes.get(label, costs.default_lot_size) for label in frame.asset_type_categories]
+    )
+    lots = lot_table[frame.asset_type_code]
+
+    target_weights = np.asarray(target_weights, dtype=np.float64)
+    current_weights = values / total_value * 100
+    drift = target_weights - current_weights
+    band = np.minimum(costs.band, costs.relative_band * target_weights)
+    outside = (np.abs(drift) > band) & ~is_cash & (prices > 0)
+    if to_band_edge:
+        drift = drift - np.sign(drift) * band
+    desired = np.where(outside, drift / 100 * total_value, 0.0)
+
+    shares = _round_lots(desired, prices, lots)
+    notional = shares * prices
+    shares[np.abs(notional) < costs.min_trade_value] = 0.0
+
+    # Buys are funded by the cash line (if any) plus the sales, net of all
+    # costs, so the cash holding never goes negative
+    available_cash = float(values[cash_row]) if cash_row is not None else 0.0
+    shares = _fund_buys(shares, prices, lots, costs, available_cash)
+
+    notional = shares * prices
+    traded = shares != 0
+    trade_costs = np.where(traded, np.abs(notional) * costs.proportional + costs.fixed, 0.0)
+    cash_change = float(-notional.sum() - trade_costs.sum())
+
+    post_values = values + notional
+    if cash_row is not None:
+        post_values[cash_row] += cash_change
+    post_total = float(post_values.sum())
+
+    rows = np.flatnonzero(traded)
+    trades: List[Dict[str, Any]] = [
+        {
+            "symbol": symbol,
+            "action": "buy" if quantity > 0 else "sell",
+            "shares": abs(quantity),
+            "price": price,
+            "value": abs(value),
+            "cost": cost
+        }
+        for symbol, quantity, price, value, cost in zip(
+            frame.symbol[rows].tolist(), shares[rows].tolist(), prices[rows].tolist(),
+            notional[rows].tolist(), trade_costs[rows].tolist()
+        )
+    ]
+
+    return {
+        "trades": trades,
+        "shares": shares,
+        "turnover": float(np.abs(notional).sum()),
+        "cost": float(trade_costs.sum()),
+        "cash_change": cash_change if cash_row is not None else 0.0,
+        "unbooked_cash": cash_change if cash_row is None else 0.0,
+        "post_trade_weights": post_values / post_total * 100 if post_total > 0 else post_values,
+        "target_weights": target_weights
+    }
+
+
+def _cash_row(frame) -> Optional[int]:
+    """Index of the largest cash holding, which funds buys and receives sales"""
+    if 'cash' not in frame.asset_type_categories:
+        return None
+    rows = np.flatnonzero(frame.asset_type_code == frame.asset_type_categories.index('cash'))
+    if rows.size == 0:
+        return None
+    return int(rows[np.argmax(frame.value[rows])])
+
+
+def _round_lots(desired_value: np.ndarray, prices: np.ndarray, lots: np.ndarray) -> np.ndarray:
+    """Share quantities for desired trade values, rounded towards zero to whole lots"""
+    shares = np.divide(desired_value, prices, out=np.zeros_like(desired_value), where=prices > 0)
+    return np.trunc(shares / lots) * lots
+
+
+def _fund_buys(
+    shares: np.ndarray,
+    prices: np.ndarray,
+    lots: np.ndarray,
+    costs: TradingCosts,
+    available_cash: float = 0.0
+) -> np.ndarray:
+    """Scale buys down so that they are paid for by available cash plus the sales, net of all costs"""
+    notional = shares * prices
+    buys = notional > 0
+    sells = notional < 0
+    proceeds = -notional[sells].sum() * (1 - costs.proportional) - costs.fixed * np.count_nonzero(sells)
+    budget = max(available_cash + proceeds, 0.0)
+    fixed = costs.fixed * np.count_nonzero(buys)
+    spend = notional[buys].sum() * (1 + costs.proportional) + fixed
+    if spend <= budget:
+        return shares
+
+    # Only the proportional part of the spend shrinks with the buys; rounding
+    # to lots below only lowers it further
+    scale = max(budget - fixed, 0.0) / (spend - fixed)
+    shares = shares.copy()
+    shares[buys] = _round_lots(notional[buys] * scale, prices[buys], lots[buys])
+    shares[buys & (np.abs(shares * prices) < costs.min_trade_value)] = 0.0
+    return shares
+
+
+def rebalance_holdings(
+    portfolio_manager,
+    target_allocation: Dict[str, float],
+    costs: Optional[TradingCosts] = None,
+    to_band_edge: bool = False
+) -> Dict[str, Any]:
+    """
+    Trade plan for a ``PortfolioManager`` from an asset class target allocation.
+
+    Labels are normalized first ("Stocks" -> "stock"), so allocations parsed
+    from LLM output can be passed as they are.
+    """
+    frame = portfolio_manager.portfolio.assets
+    class_targets = normalize_allocation(target_allocation)
+    plan = plan_trades(frame, holding_targets(frame, class_targets), costs, to_band_edge)
+    plan["target_allocation"] = class_targets
+    return plan
+
+
+def apply_trade_plan(portfolio_manager, plan: Dict[str, Any]) -> None:
+    """Book a plan's trades (and their costs, against cash) on the portfolio's holdings"""
+    frame = portfolio_manager.portfolio.assets
+    values = frame.value + plan["shares"] * frame.current_price
+    cash_row = _cash_row(frame)
+    if cash_row is not None:
+        values[cash_row] += plan["cash_change"]
+
+    frame.value[:] = values
+    total_value = float(values.sum())
+    if total_value > 0:
+        frame.allocation[:] = values / total_value * 100
+    frame.touch()
+    portfolio_manager.portfolio.total_value = total_value
@@ -1,6 +1,13 @@
-from typing import Dict, List, Any
+import os
+from typing import Dict, List, Any, Iterator, Optional, Sequence
 from dataclasses import dataclass
 
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 100_000
+# Answer code for a missing or unrecognized answer; it scores 0 like in calculate_risk_score
+NO_ANSWER = 0
+
 @dataclass
 class RiskQuestion:
     id: int
@@ -19,6 +26,29 @@ class RiskProfiler:
     def __init__(self):
         self.questions = self._initialize_questions()
         self.risk_profiles = self._initialize_risk_profiles()
+        self._compile()
+    
+    def _compile(self):
+        """Compile questions and profiles into lookup tables for batch scoring"""
+        self.question_ids = [question.id for question in self.questions]
+        # Answer value -> option code per question; code 0 is reserved for "no answer"
+        self.option_codes = [
+            {option["value"]: code for code, option in enumerate(question.options, start=1)}
+            for question in self.questions
+        ]
+        num_options = max(len(question.options) for question in self.questions)
+        self.score_table = np.zeros((len(self.questions), num_options + 1), dtype=np.int32)
+        for row, question in enumerate(self.questions):
+            self.score_table[row, 1:len(question.options) + 1] = [option["score"] for option in question.options]
+        
+        # Total score -> index into profile_keys, with the same first-match and
+        # "moderate" fallback rules as determine_risk_profile
+        self.profile_keys = list(self.risk_profiles)
+        max_score = int(self.score_table.max(axis=1).sum())
+        self.score_profiles = np.full(max_score + 1, self.profile_keys.index("moderate"), dtype=np.int8)
+        for index in reversed(range(len(self.profile_keys))):
+            low, high = self.risk_profiles[self.profile_keys[index]].score_range
+            self.score_profiles[max(low, 0):min(high, max_score) + 1] = index
     
     def _initialize_questions(self) -> List[RiskQuestion]:
         """Initialize risk assessment questions"""
@@ -145,14 +175,10 @@ class RiskProfiler:
         """Calculate total risk score from answers"""
         total_score = 0
         
-        for question in self.questions:
+        for row, question in enumerate(self.questions):
             answer_value = answers.get(question.id)
             if answer_value:
-                # Find the score for this answer
-                for option in question.options:
-                    if option["value"] == answer_value:
-                        total_score += option["score"]
-                        break
+                total_score += int(self.score_table[row, self.option_codes[row].get(answer_value, NO_ANSWER)])
         
         return total_score
     
@@ -167,6 +193,92 @@ class RiskProfiler:
         # Default to moderate if no match
         return self.risk_profiles["moderate"]
     
+    def encode_answers(self, answers) -> np.ndarray:
+        """
+        Option codes for a (questionnaires, questions) matrix of answer values.
+        
+        Columns follow ``self.questions``; missing (None/NaN/empty) and unknown
+        answers become NO_ANSWER. Each column is encoded through its unique
+        values, so the per-element work is a single array gather.
+        """
+        answers = np.asarray(answers, dtype=object)
+        if answers.ndim != 2 or answers.shape[1] != len(self.questions):
+            raise ValueError(f"Expected answers of shape (n, {len(self.questions)}), got {answers.shape}")
+        
+        codes = np.zeros(answers.shape, dtype=np.int8)
+        for column, option_codes in enumerate(self.option_codes):
+            values, inverse = np.unique(answers[:, column].astype(str), return_inverse=True)
+            lookup = np.array([option_codes.get(_answer_value(value), NO_ANSWER) for value in values], dtype=np.int8)
+            codes[:, column] = lookup[inverse.reshape(-1)]
+        return codes
+    
+    def score_batch(self, answers) -> Dict[str, np.ndarray]:
+        """
+        Risk scores and profiles for many questionnaires at once.
+        
+        Args:
+            answers: (questionnaires, questions) matrix, either option codes from
+                ``encode_answers`` (integer dtype) or raw answer values
+        
+        Returns:
+            Dictionary with ``risk_score`` per questionnaire and ``profile``, an
+            index into ``profile_keys``
+        """
+        codes = np.asarray(answers)
+        if not np.issubdtype(codes.dtype, np.integer):
+            codes = self.encode_answers(codes)
+        elif codes.ndim != 2 or codes.shape[1] != len(self.questions):
+            raise ValueError(f"Expected answers of shape (n, {len(self.questions)}), got {codes.shape}")
+        
+        scores = self.score_table[np.arange(len(self.questions)), codes].sum(axis=1)
+        profiles = self.score_profiles[np.clip(scores, 0, len(self.score_profiles) - 1)]
+        return {"risk_score": scores, "profile": profiles}
+    
+    def score_file(
+        self,
+        input_path: str,
+        output_path: str,
+        question_columns: Optional[Sequence[str]] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> int:
+        """
+        Score a CSV or Arrow (IPC/Feather) file of questionnaires chunk by chunk.
+        
+        Every input column is written through with ``risk_score`` and
+        ``risk_profile`` appended; the output format follows the extension of
+        ``output_path``. Only one chunk is held in memory at a time.
+        
+        Args:
+            input_path: One row per questionnaire
+            output_path: Destination file
+            question_columns: Answer columns in question order; defaults to
+                ``q<id>`` or, when absent, the bare question ids
+            chunk_size: Rows per chunk
+        
+        Returns:
+            Number of questionnaires scored
+        """
+        with _ChunkWriter(output_path) as writer:
+            count = 0
+            for chunk in _read_chunks(input_path, chunk_size):
+                columns = question_columns or self._question_columns(chunk.columns)
+                scored = self.score_batch(chunk[list(columns)].to_numpy(dtype=object))
+                chunk["risk_score"] = scored["risk_score"]
+                chunk["risk_profile"] = np.array(
+                    [self.risk_profiles[key].name for key in self.profile_keys], dtype=object
+                )[scored["profile"]]
+                writer.write(chunk)
+                count += len(chunk)
+        return count
+    
+    def _question_columns(self, columns) -> List[str]:
+        """Default answer column names for a file's header"""
+        names = [str(column) for column in columns]
+        for candidates in ([f"q{qid}" for qid in self.question_ids], [str(qid) for qid in self.question_ids]):
+            if all(candidate in names for candidate in candidates):
+                return candidates
+        raise ValueError(f"No answer columns for questions {self.question_ids} in {names}")
+    
     def get_personalized_recommendations(self, risk_profile: RiskProfile) -> Dict[str, Any]:
         """Get personalized investment recommendations"""
         recommendations = {
@@ -238,6 +350,70 @@ class RiskProfiler:
         
         return considerations.get(profile.name, considerations["Moderate"])
 
+def _answer_value(value: str) -> str:
+    """Answer values as strings, so numeric columns read back as '3.0' match option '3'"""
+    if value.endswith(".0") and value[:-2].isdigit():
+        return value[:-2]
+    return value
+
+
+def _is_arrow(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in (".arrow", ".feather", ".ipc")
+
+
+def _read_chunks(path: str, chunk_size: int) -> Iterator:
+    """DataFrame chunks of a CSV or Arrow IPC file"""
+    if not _is_arrow(path):
+        import pandas as pd
+        
+        yield from pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size)
+        return
+    
+    import pyarrow as pa
+    
+    with pa.memory_map(path) as source:
+        try:
+            reader = pa.ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            source.seek(0)
+            batches = pa.ipc.open_stream(source)
+        for batch in batches:
+            for start in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(start, chunk_size).to_pandas()
+
+
+class _ChunkWriter:
+    """Appends DataFrame chunks to a CSV or Arrow IPC file"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.arrow = _is_arrow(path)
+        self._writer = None
+        self._file = None
+    
+    def __enter__(self):
+        return self
+    
+    def write(self, chunk) -> None:
+        if not self.arrow:
+            chunk.to_csv(self.path, mode="a" if self._file else "w", header=not self._file, index=False)
+            self._file = self.path
+            return
+        
+        import pyarrow as pa
+        
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            self._writer = pa.ipc.new_file(self.path, table.schema)
+        self._writer.write_table(table)
+    
+    def __exit__(self, *exc_info):
+        if self._writer is not None:
+            self._writer.close()
+        return False
+
+
 if __name__ == "__main__":
     # Test the risk profiler
     profiler = RiskProfiler()
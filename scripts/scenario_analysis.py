@@ -1,77 +1,925 @@
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
 import matplotlib.pyplot as plt
-from portfolio_manager import PortfolioManager
+from scripts.portfolio_manager import Asset, PortfolioManager
+from scripts.price_store import PriceStore
+from scripts.simulation_cache import SimulationCache, default_simulation_cache, make_cache_key
+from scripts.streaming_stats import MonteCarloAccumulator, path_drawdowns, summarize_drawdowns
 
-class ScenarioAnalyzer:
-    def __init__(self):
-        self.portfolio_manager = PortfolioManager()
-        
-    def monte_carlo_simulation(self, num_simulations: int = 1000, time_horizon: int = 252) -> Dict:
-        """Run Monte Carlo simulation for portfolio returns"""
-        portfolio_data = self.portfolio_manager.to_dict()
-        
-        # Asset expected returns and volatilities (simplified)
-        asset_returns = {
-            'stock': {'return': 0.10, 'volatility': 0.16},
-            'bond': {'return': 0.04, 'volatility': 0.05},
-            'crypto': {'return': 0.15, 'volatility': 0.60},
-            'cash': {'return': 0.02, 'volatility': 0.01}
+# Annualized return and volatility assumptions per asset class (simplified)
+ASSET_CLASS_ASSUMPTIONS = {
+    'stock': {'return': 0.10, 'volatility': 0.16},
+    'bond': {'return': 0.04, 'volatility': 0.05},
+    'crypto': {'return': 0.15, 'volatility': 0.60},
+    'cash': {'return': 0.02, 'volatility': 0.01}
+}
+
+# Illustrative correlations used by default_covariance (within-class pairs use
+# the diagonal entry)
+ASSET_CLASS_CORRELATIONS = {
+    ('stock', 'stock'): 0.60,
+    ('bond', 'bond'): 0.70,
+    ('crypto', 'crypto'): 0.80,
+    ('cash', 'cash'): 0.90,
+    ('stock', 'bond'): -0.10,
+    ('stock', 'crypto'): 0.30,
+    ('bond', 'crypto'): 0.00,
+}
+
+# Stress factors and each asset class's move (percent) per unit shock: rates
+# and spreads in percentage points, equity and crypto in percent. The rate
+# column is the sensitivity interest_rate_scenarios has always used; the other
+# columns are illustrative
+STRESS_FACTORS = ('rates', 'equity', 'crypto', 'spreads')
+STRESS_SENSITIVITIES = {
+    'stock': {'rates': -0.5, 'equity': 1.0, 'crypto': 0.0, 'spreads': -3.0},
+    'bond': {'rates': -2.0, 'equity': 0.0, 'crypto': 0.0, 'spreads': -1.0},
+    'crypto': {'rates': -1.0, 'equity': 0.3, 'crypto': 1.0, 'spreads': -2.0},
+    'cash': {'rates': 1.0, 'equity': 0.0, 'crypto': 0.0, 'spreads': 0.0}
+}
+
+# Named historical episodes for replay: (start, end, description)
+HISTORICAL_WINDOWS = {
+    'gfc_2008': ('2008-09-01', '2009-03-09', 'Global Financial Crisis'),
+    'covid_2020': ('2020-02-19', '2020-04-30', 'COVID-19 crash (March 2020)'),
+    'rates_2022': ('2022-01-03', '2022-10-31', '2022 rate shock')
+}
+
+TRADING_DAYS = 252
+
+# Paths generated per batch in streaming mode; peak memory is
+# chunk_size * (time_horizon + 1) values regardless of num_simulations
+DEFAULT_CHUNK_SIZE = 8192
+
+# Generates a (num_paths, time_horizon + 1) block of portfolio value paths
+PathGenerator = Callable[[np.random.Generator, int, int], np.ndarray]
+
+
+def simulate_portfolio_paths(
+    rng: np.random.Generator,
+    num_paths: int,
+    time_horizon: int,
+    daily_return: float,
+    daily_volatility: float,
+    initial_value: float,
+    dtype: type = np.float64
+) -> np.ndarray:
+    """
+    Simulate portfolio value paths in a single vectorized pass.
+
+    All daily shocks are drawn as one (num_paths, time_horizon) matrix and
+    compounded with a cumulative product along the time axis.
+
+    Returns:
+        Array of shape (num_paths, time_horizon + 1) whose first column is the
+        initial value
+    """
+    paths = np.empty((num_paths, time_horizon + 1), dtype=dtype)
+    paths[:, 0] = initial_value
+
+    growth = rng.standard_normal((num_paths, time_horizon), dtype=dtype)
+    growth *= daily_volatility
+    growth += 1 + daily_return
+
+    np.cumprod(growth, axis=1, out=paths[:, 1:])
+    paths[:, 1:] *= initial_value
+    return paths
+
+
+def accumulate_paths(
+    path_generator: PathGenerator,
+    rng: np.random.Generator,
+    num_paths: int,
+    time_horizon: int,
+    accumulator: MonteCarloAccumulator,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> MonteCarloAccumulator:
+    """Generate paths in fixed-size chunks, folding each into the accumulator and discarding it"""
+    for start in range(0, num_paths, chunk_size):
+        paths = path_generator(rng, min(chunk_size, num_paths - start), time_horizon)
+        accumulator.update(paths)
+        del paths
+
+    return accumulator
+
+
+def _accumulate_worker(
+    path_generator: PathGenerator,
+    seed_sequence: np.random.SeedSequence,
+    num_paths: int,
+    time_horizon: int,
+    accumulator: MonteCarloAccumulator,
+    chunk_size: int
+) -> MonteCarloAccumulator:
+    """Process-pool entry point: simulate one share of the paths and return only its statistics"""
+    return accumulate_paths(
+        path_generator, np.random.default_rng(seed_sequence), num_paths, time_horizon, accumulator, chunk_size
+    )
+
+
+def parallel_accumulate_paths(
+    path_generator: PathGenerator,
+    seed: Optional[int],
+    num_paths: int,
+    time_horizon: int,
+    accumulator: MonteCarloAccumulator,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    num_workers: Optional[int] = None
+) -> MonteCarloAccumulator:
+    """
+    Split path generation across a process pool.
+
+    Each worker gets an independent child of ``np.random.SeedSequence(seed)``
+    and a fixed share of the paths, and sends back only its accumulator. The
+    accumulators are merged in worker order, so the result is bit-for-bit
+    reproducible for a given seed, worker count and chunk size.
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    children = np.random.SeedSequence(seed).spawn(num_workers)
+    shares = [num_paths // num_workers + (1 if i < num_paths % num_workers else 0)
+              for i in range(num_workers)]
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(
+                _accumulate_worker, path_generator, child, share, time_horizon, accumulator, chunk_size
+            )
+            for child, share in zip(children, shares)
+        ]
+        for future in futures:
+            accumulator.merge(future.result())
+
+    return accumulator
+
+
+def make_accumulator(
+    initial_value: float,
+    portfolio_return: float,
+    portfolio_volatility: float,
+    time_horizon: int
+) -> MonteCarloAccumulator:
+    """Accumulator whose sketch grid spans +/- 8 sigma of the final value distribution"""
+    years = time_horizon / TRADING_DAYS
+    log_mean = (portfolio_return - portfolio_volatility ** 2 / 2) * years
+    log_std = max(portfolio_volatility * np.sqrt(years), 1e-6)
+
+    return MonteCarloAccumulator(
+        initial_value,
+        lower=initial_value * np.exp(log_mean - 8 * log_std),
+        upper=initial_value * np.exp(log_mean + 8 * log_std),
+        time_horizon=time_horizon
+    )
+
+
+def final_value_statistics(final_values: np.ndarray, initial_value: float) -> Dict:
+    """Exact summary statistics of an in-memory array of final portfolio values"""
+    percentile_1, percentile_5 = np.percentile(final_values, [1, 5])
+
+    return {
+        'mean_final_value': np.mean(final_values),
+        'median_final_value': np.median(final_values),
+        'std_final_value': np.std(final_values),
+        'percentile_1': percentile_1,
+        'percentile_5': percentile_5,
+        'percentile_95': np.percentile(final_values, 95),
+        'tail_mean_1': np.mean(final_values[final_values <= percentile_1]),
+        'tail_mean_5': np.mean(final_values[final_values <= percentile_5]),
+        'probability_of_loss': np.mean(final_values < initial_value),
+        'expected_return': (np.mean(final_values) - initial_value) / initial_value,
+        'initial_value': initial_value,
+        'num_simulations': len(final_values)
+    }
+
+
+def drawdown_distribution(paths: np.ndarray, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """Exact maximum drawdown and recovery distribution over every path, in chunks"""
+    max_drawdowns, recovery_days = zip(*(
+        path_drawdowns(paths[start:start + chunk_size])
+        for start in range(0, len(paths), chunk_size)
+    ))
+    return summarize_drawdowns(np.concatenate(max_drawdowns), np.concatenate(recovery_days))
+
+
+def default_covariance(assets: List[Asset]) -> np.ndarray:
+    """Annualized holding covariance built from the asset class assumptions"""
+    asset_types = [asset.asset_type for asset in assets]
+    volatilities = np.array([ASSET_CLASS_ASSUMPTIONS[t]['volatility'] for t in asset_types])
+
+    correlation = np.empty((len(assets), len(assets)))
+    for i, first in enumerate(asset_types):
+        for j, second in enumerate(asset_types):
+            correlation[i, j] = ASSET_CLASS_CORRELATIONS.get(
+                (first, second), ASSET_CLASS_CORRELATIONS.get((second, first), 0.0)
+            )
+    np.fill_diagonal(correlation, 1.0)
+
+    return correlation * np.outer(volatilities, volatilities)
+
+
+def shock_grid(**axes) -> np.ndarray:
+    """
+    Cartesian grid of factor shocks, e.g. ``shock_grid(rates=[-2, 0, 2], equity=np.linspace(-40, 20, 61))``.
+
+    Factors that are not given stay at 0.
+
+    Returns:
+        Array of shape (num_scenarios, len(STRESS_FACTORS))
+    """
+    unknown = set(axes) - set(STRESS_FACTORS)
+    if unknown:
+        raise ValueError(f"Unknown stress factors: {sorted(unknown)}")
+
+    values = [np.atleast_1d(np.asarray(axes.get(factor, 0.0), dtype=np.float64)) for factor in STRESS_FACTORS]
+    mesh = np.meshgrid(*values, indexing='ij')
+    return np.stack([m.ravel() for m in mesh], axis=1)
+
+
+def stress_sensitivities(assets) -> np.ndarray:
+    """(num_holdings, len(STRESS_FACTORS)) sensitivities of a PortfolioFrame's holdings"""
+    table = np.array([
+        [STRESS_SENSITIVITIES.get(label, {}).get(factor, 0.0) for factor in STRESS_FACTORS]
+        for label in assets.asset_type_categories
+    ])
+    return table[assets.asset_type_code]
+
+
+def stress_grid(
+    shocks: np.ndarray,
+    sensitivities: np.ndarray,
+    weights: np.ndarray,
+    initial_value: float,
+    months: int = 12,
+    noise_std: float = 0.0,
+    num_paths: int = 1,
+    rng: Optional[np.random.Generator] = None,
+    max_block: int = 1 << 22
+) -> Dict:
+    """
+    Evaluate a grid of factor shocks against per-holding sensitivities.
+
+    The shock is phased in linearly over ``months``. Holding impacts are one
+    (scenarios x factors) @ (factors x holdings) product; optional monthly
+    noise (percent, independent per month) is drawn in bulk for
+    ``num_paths`` paths per scenario, in scenario blocks of at most
+    ``max_block`` values.
+
+    Returns:
+        Dictionary of arrays with one row per scenario: ``holding_impact``
+        (scenarios, holdings) and ``impact`` (percent), ``monthly_values``
+        (scenarios, months; averaged over the noise paths), ``final_value``,
+        plus ``final_value_percentile_5`` when there is more than one path.
+    """
+    shocks = np.atleast_2d(np.asarray(shocks, dtype=np.float64))
+    holding_impact = (shocks @ sensitivities.T) * weights
+    impact = holding_impact.sum(axis=1)
+
+    time_factor = np.arange(1, months + 1) / months
+    drift = impact[:, None] * time_factor
+
+    result = {'holding_impact': holding_impact, 'impact': impact}
+    if noise_std > 0:
+        rng = rng if rng is not None else np.random.default_rng()
+        num_scenarios = len(shocks)
+        monthly_values = np.empty((num_scenarios, months))
+        final_p5 = np.empty(num_scenarios) if num_paths > 1 else None
+
+        block = max(1, max_block // (num_paths * months))
+        for start in range(0, num_scenarios, block):
+            stop = min(start + block, num_scenarios)
+            paths = rng.normal(0.0, noise_std, (stop - start, num_paths, months))
+            paths += drift[start:stop, None, :]
+            paths = initial_value * (1 + paths / 100)
+            monthly_values[start:stop] = paths.mean(axis=1)
+            if final_p5 is not None:
+                final_p5[start:stop] = np.percentile(paths[:, :, -1], 5, axis=1)
+
+        if final_p5 is not None:
+            result['final_value_percentile_5'] = final_p5
+    else:
+        monthly_values = initial_value * (1 + drift / 100)
+
+    result['monthly_values'] = monthly_values
+    result['final_value'] = monthly_values[:, -1]
+    return result
+
+
+def summarize_stress(shocks: np.ndarray, impact: np.ndarray, worst: int = 5) -> Dict:
+    """Distribution of scenario impacts and the worst / best scenarios"""
+    order = np.argsort(impact)
+
+    def describe(i: int) -> Dict:
+        return {
+            'shocks': dict(zip(STRESS_FACTORS, shocks[i].tolist())),
+            'impact_percent': float(impact[i])
         }
-        
-        # Portfolio weights
+
+    return {
+        'num_scenarios': len(impact),
+        'mean_impact_percent': float(impact.mean()),
+        'impact_percentiles': dict(zip(
+            ('1', '5', '50', '95', '99'), np.percentile(impact, [1, 5, 50, 95, 99]).tolist()
+        )),
+        'probability_of_loss': float(np.mean(impact < 0)),
+        'worst_scenarios': [describe(i) for i in order[:worst]],
+        'best_scenario': describe(order[-1])
+    }
+
+
+def window_returns(store: PriceStore, symbols: List[str], start, end) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Daily simple returns of symbols over a stored date window.
+
+    Symbols without history in the window (e.g. cash, or assets that did not
+    trade yet) get zero returns, i.e. they are treated as flat.
+
+    Returns:
+        Tuple of (dates, returns) with returns of shape (days, len(symbols));
+        ``dates`` are the days each return ends on
+    """
+    dates, _ = store.window(start, end)
+    returns = np.zeros((max(len(dates) - 1, 0), len(symbols)))
+    known = [i for i, symbol in enumerate(symbols) if symbol in store]
+    if known and len(dates) > 1:
+        prices = store.prices([symbols[i] for i in known], start, end)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns[:, known] = np.nan_to_num(prices[1:] / prices[:-1] - 1, nan=0.0, posinf=0.0, neginf=0.0)
+    return np.asarray(dates[1:]), returns
+
+
+def replay_returns(weights: np.ndarray, returns: np.ndarray) -> Dict:
+    """
+    Replay a window of daily holding returns against buy-and-hold weights.
+
+    Args:
+        weights: (num_portfolios, num_holdings) weights as fractions
+        returns: (days, num_holdings) daily simple returns
+
+    Returns:
+        Dictionary with ``paths`` (num_portfolios, days + 1) of portfolio value
+        relative to the start, ``total_return``, ``max_drawdown``,
+        ``recovery_days`` (NaN if not recovered), ``worst_day_return`` and
+        ``worst_day_index`` per portfolio
+    """
+    weights = np.atleast_2d(weights)
+    growth = np.vstack([np.ones(returns.shape[1]), np.cumprod(1 + returns, axis=0)])
+    paths = weights @ growth.T
+
+    max_drawdown, recovery_days = path_drawdowns(paths)
+    daily = paths[:, 1:] / paths[:, :-1] - 1 if returns.shape[0] else np.zeros((len(paths), 1))
+    worst_day = daily.argmin(axis=1)
+
+    return {
+        'paths': paths,
+        'total_return': paths[:, -1] / paths[:, 0] - 1,
+        'max_drawdown': max_drawdown,
+        'recovery_days': recovery_days,
+        'worst_day_return': daily[np.arange(len(paths)), worst_day],
+        'worst_day_index': worst_day
+    }
+
+
+class CorrelatedHoldingModel:
+    """
+    Holding-level return model driven by a covariance matrix.
+
+    The daily covariance is factored once (Cholesky, with an eigenvalue
+    fallback for matrices that are only positive semi-definite) and the factor
+    is cached on the model. Each simulated day is one matrix multiply of a
+    (num_paths, num_assets) block of standard normals with the factor, so the
+    cost per step does not involve a Python loop over holdings.
+    """
+
+    def __init__(
+        self,
+        symbols: List[str],
+        initial_values: np.ndarray,
+        expected_returns: np.ndarray,
+        covariance: np.ndarray
+    ):
+        covariance = np.asarray(covariance, dtype=np.float64)
+        num_assets = len(symbols)
+        if covariance.shape != (num_assets, num_assets):
+            raise ValueError(
+                f"Covariance shape {covariance.shape} does not match {num_assets} holdings"
+            )
+
+        self.symbols = list(symbols)
+        self.initial_values = np.asarray(initial_values, dtype=np.float64)
+        self.expected_returns = np.asarray(expected_returns, dtype=np.float64)
+        self.covariance = covariance
+        self._factor: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_assets(
+        cls,
+        assets: List[Asset],
+        covariance: np.ndarray,
+        expected_returns: Optional[np.ndarray] = None
+    ) -> "CorrelatedHoldingModel":
+        """Build a model for the given holdings; returns default to the asset class assumptions"""
+        if expected_returns is None:
+            expected_returns = [ASSET_CLASS_ASSUMPTIONS[asset.asset_type]['return'] for asset in assets]
+
+        return cls(
+            [asset.symbol for asset in assets],
+            [asset.value for asset in assets],
+            expected_returns,
+            covariance
+        )
+
+    @property
+    def factor(self) -> np.ndarray:
+        """Cached factor L of the daily covariance, with L @ L.T == covariance / TRADING_DAYS"""
+        if self._factor is None:
+            daily_covariance = self.covariance / TRADING_DAYS
+            try:
+                self._factor = np.linalg.cholesky(daily_covariance)
+            except np.linalg.LinAlgError:
+                eigenvalues, eigenvectors = np.linalg.eigh(daily_covariance)
+                self._factor = eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+        return self._factor
+
+    def portfolio_parameters(self) -> Tuple[float, float]:
+        """Annual expected return and volatility of the current holdings"""
+        weights = self.initial_values / self.initial_values.sum()
+        portfolio_return = float(weights @ self.expected_returns)
+        portfolio_volatility = float(np.sqrt(weights @ self.covariance @ weights))
+        return portfolio_return, portfolio_volatility
+
+    def simulate_paths(
+        self,
+        rng: np.random.Generator,
+        num_paths: int,
+        time_horizon: int,
+        dtype: type = np.float64
+    ) -> np.ndarray:
+        """Simulate buy-and-hold portfolio value paths of shape (num_paths, time_horizon + 1)"""
+        factor_t = self.factor.T.astype(dtype, copy=False)
+        daily_growth = (1 + self.expected_returns / TRADING_DAYS).astype(dtype)
+
+        holdings = np.tile(self.initial_values.astype(dtype), (num_paths, 1))
+        paths = np.empty((num_paths, time_horizon + 1), dtype=dtype)
+        paths[:, 0] = self.initial_values.sum()
+
+        shocks = np.empty_like(holdings)
+        for day in range(1, time_horizon + 1):
+            rng.standard_normal(out=shocks, dtype=dtype)
+            growth = shocks @ factor_t  # Correlated daily returns, one BLAS call
+            growth += daily_growth
+            holdings *= growth
+            paths[:, day] = holdings.sum(axis=1)
+
+        return paths
+
+
+class ScenarioAnalyzer:
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        cache: Optional[SimulationCache] = None,
+        portfolio_manager: Optional[PortfolioManager] = None
+    ):
+        """
+        Args:
+            seed: Default simulation seed. When omitted, one is drawn once per
+                analyzer so repeated requests reuse the same cached simulation;
+                pass an explicit ``seed`` to a method for a different draw.
+            cache: Simulation result cache; defaults to the process-wide cache
+            portfolio_manager: Portfolio to analyze; defaults to a new ``PortfolioManager``
+        """
+        self.portfolio_manager = portfolio_manager if portfolio_manager is not None else PortfolioManager()
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy % 2**63)
+        self.cache = cache if cache is not None else default_simulation_cache
+        self._holding_models: Dict[str, CorrelatedHoldingModel] = {}
+        self._portfolio_version: Optional[tuple] = None
+        self._portfolio_key: Optional[str] = None
+        self._portfolio_data: Optional[Dict] = None
+
+    def _portfolio_state(self) -> Tuple[Dict, str]:
+        """
+        Portfolio data and a hash of everything it is derived from (holdings,
+        portfolio fields and return history), recomputed only when the
+        manager's state token changes
+        """
+        manager = self.portfolio_manager
+        version = manager._state_version()
+        if version != self._portfolio_version:
+            portfolio = manager.portfolio
+            estimator = manager.return_estimator
+            history = (
+                (estimator.count, estimator.mean, estimator.ewma, estimator.ewma_weight)
+                if estimator is not None else (None,)
+            )
+            self._portfolio_key = make_cache_key(
+                portfolio.assets.fingerprint(), portfolio.total_value, portfolio.risk_profile, *history
+            )
+            self._portfolio_data = manager.to_dict()
+            self._portfolio_version = version
+        return self._portfolio_data, self._portfolio_key
+
+    def _portfolio_parameters(self, portfolio_data: Dict) -> Tuple[float, float]:
+        """Expected annual return and volatility of the asset class mix"""
         weights = portfolio_data['asset_allocation']
         total_weight = sum(weights.values())
         normalized_weights = {k: v/total_weight for k, v in weights.items()}
-        
-        # Calculate portfolio expected return and volatility
-        portfolio_return = sum(normalized_weights[asset] * asset_returns[asset]['return'] 
-                             for asset in normalized_weights)
-        
-        portfolio_volatility = np.sqrt(sum((normalized_weights[asset] * asset_returns[asset]['volatility'])**2 
-                                         for asset in normalized_weights))
-        
-        # Run simulations
-        initial_value = portfolio_data['total_value']
-        simulations = []
-        
-        for _ in range(num_simulations):
-            daily_returns = np.random.normal(
-                portfolio_return / 252,  # Daily return
-                portfolio_volatility / np.sqrt(252),  # Daily volatility
-                time_horizon
-            )
-            
-            # Calculate cumulative portfolio value
-            portfolio_values = [initial_value]
-            for daily_return in daily_returns:
-                new_value = portfolio_values[-1] * (1 + daily_return)
-                portfolio_values.append(new_value)
-            
-            simulations.append(portfolio_values)
-        
-        # Calculate statistics
-        final_values = [sim[-1] for sim in simulations]
-        
+
+        portfolio_return = sum(normalized_weights[asset] * ASSET_CLASS_ASSUMPTIONS[asset]['return']
+                               for asset in normalized_weights)
+
+        portfolio_volatility = np.sqrt(sum((normalized_weights[asset] * ASSET_CLASS_ASSUMPTIONS[asset]['volatility'])**2
+                                           for asset in normalized_weights))
+
+        return portfolio_return, portfolio_volatility
+
+    def _path_generator(self, portfolio_data: Dict, use_float32: bool = False) -> PathGenerator:
+        """Path generator for the asset class model of the given portfolio"""
+        portfolio_return, portfolio_volatility = self._portfolio_parameters(portfolio_data)
+
+        return partial(
+            simulate_portfolio_paths,
+            daily_return=portfolio_return / TRADING_DAYS,
+            daily_volatility=portfolio_volatility / np.sqrt(TRADING_DAYS),
+            initial_value=portfolio_data['total_value'],
+            dtype=np.float32 if use_float32 else np.float64
+        )
+
+    def _run_simulation(
+        self,
+        path_generator: PathGenerator,
+        initial_value: float,
+        model_parameters: Tuple[float, float],
+        num_simulations: int,
+        time_horizon: int,
+        seed: Optional[int],
+        streaming: bool,
+        chunk_size: int,
+        num_workers: int = 1,
+        model_key: Tuple = ()
+    ) -> Dict:
+        """
+        Run a path generator in memory, in streaming mode or across a process pool.
+
+        Results are cached under a hash of ``model_key`` (which must identify the
+        portfolio state and model) and every argument that changes the draws.
+        """
+        seed = self.seed if seed is None else seed
+        streaming = streaming or num_workers > 1
+        key = make_cache_key(
+            'simulation', *model_key, model_parameters, num_simulations, time_horizon, seed,
+            streaming, chunk_size if streaming else None, num_workers
+        )
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        return self.cache.put(key, self._simulate(
+            path_generator, initial_value, model_parameters, num_simulations,
+            time_horizon, seed, streaming, chunk_size, num_workers
+        ))
+
+    def _simulate(
+        self,
+        path_generator: PathGenerator,
+        initial_value: float,
+        model_parameters: Tuple[float, float],
+        num_simulations: int,
+        time_horizon: int,
+        seed: int,
+        streaming: bool,
+        chunk_size: int,
+        num_workers: int
+    ) -> Dict:
+        """Uncached simulation backing ``_run_simulation``"""
+        rng = np.random.default_rng(seed)
+
+        if streaming:
+            accumulator = make_accumulator(initial_value, *model_parameters, time_horizon)
+
+            if num_workers > 1:
+                accumulator = parallel_accumulate_paths(
+                    path_generator, seed, num_simulations, time_horizon, accumulator, chunk_size, num_workers
+                )
+            else:
+                accumulator = accumulate_paths(
+                    path_generator, rng, num_simulations, time_horizon, accumulator, chunk_size
+                )
+
+            return {
+                'statistics': accumulator.statistics(),
+                'drawdown': accumulator.drawdown_statistics()
+            }
+
+        simulations = path_generator(rng, num_simulations, time_horizon)
+
+        # Statistics are always accumulated in float64
+        final_values = simulations[:, -1].astype(np.float64)
+
         return {
             'simulations': simulations,
             'final_values': final_values,
-            'statistics': {
-                'mean_final_value': np.mean(final_values),
-                'median_final_value': np.median(final_values),
-                'std_final_value': np.std(final_values),
-                'percentile_5': np.percentile(final_values, 5),
-                'percentile_95': np.percentile(final_values, 95),
-                'probability_of_loss': sum(1 for val in final_values if val < initial_value) / len(final_values),
-                'expected_return': (np.mean(final_values) - initial_value) / initial_value,
-                'initial_value': initial_value
-            }
+            'statistics': final_value_statistics(final_values, initial_value)
         }
-    
-    def interest_rate_scenarios(self) -> Dict:
+
+    def monte_carlo_simulation(
+        self,
+        num_simulations: int = 1000,
+        time_horizon: int = 252,
+        seed: Optional[int] = None,
+        use_float32: bool = False
+    ) -> Dict:
+        """
+        Run Monte Carlo simulation for portfolio returns.
+
+        Args:
+            num_simulations: Number of simulated paths
+            time_horizon: Number of trading days per path
+            seed: Seed for the ``np.random.Generator``; defaults to the analyzer seed
+            use_float32: Simulate paths in float32 to halve memory and bandwidth
+
+        Returns:
+            Simulated paths as a (num_simulations, time_horizon + 1) array, the
+            final values and summary statistics
+        """
+        portfolio_data, portfolio_key = self._portfolio_state()
+
+        return self._run_simulation(
+            self._path_generator(portfolio_data, use_float32),
+            portfolio_data['total_value'],
+            self._portfolio_parameters(portfolio_data),
+            num_simulations,
+            time_horizon,
+            seed,
+            streaming=False,
+            chunk_size=num_simulations,
+            model_key=('asset_class', portfolio_key, use_float32)
+        )
+
+    def streaming_monte_carlo(
+        self,
+        num_simulations: int = 1_000_000,
+        time_horizon: int = 252,
+        seed: Optional[int] = None,
+        use_float32: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        num_workers: int = 1
+    ) -> Dict:
+        """
+        Run a constant-memory Monte Carlo simulation.
+
+        Paths are generated ``chunk_size`` at a time and folded into running
+        statistics, so peak memory does not depend on ``num_simulations``.
+        Percentiles and tail means come from a mergeable quantile sketch.
+        With ``num_workers > 1`` the paths are split across a process pool
+        (see ``parallel_accumulate_paths``).
+
+        Returns:
+            Summary statistics in the same layout as ``monte_carlo_simulation``
+            and the drawdown distribution (no paths or final values are kept)
+        """
+        portfolio_data, portfolio_key = self._portfolio_state()
+
+        return self._run_simulation(
+            self._path_generator(portfolio_data, use_float32),
+            portfolio_data['total_value'],
+            self._portfolio_parameters(portfolio_data),
+            num_simulations,
+            time_horizon,
+            seed,
+            streaming=True,
+            chunk_size=chunk_size,
+            num_workers=num_workers,
+            model_key=('asset_class', portfolio_key, use_float32)
+        )
+
+    def _holding_model_with_key(
+        self,
+        covariance: Optional[np.ndarray],
+        expected_returns: Optional[np.ndarray]
+    ) -> Tuple[str, CorrelatedHoldingModel]:
+        """Cached holding model and the key identifying holdings, covariance and returns"""
+        _, portfolio_key = self._portfolio_state()
+        assets = self.portfolio_manager.portfolio.assets
+        if covariance is None:
+            covariance = default_covariance(assets)
+        covariance = np.asarray(covariance, dtype=np.float64)
+        if expected_returns is not None:
+            expected_returns = np.asarray(expected_returns, dtype=np.float64)
+
+        key = make_cache_key(portfolio_key, covariance, expected_returns)
+        if key not in self._holding_models:
+            if len(self._holding_models) >= 16:
+                self._holding_models.clear()
+            self._holding_models[key] = CorrelatedHoldingModel.from_assets(
+                assets, covariance, expected_returns
+            )
+        return key, self._holding_models[key]
+
+    def holding_model(
+        self,
+        covariance: Optional[np.ndarray] = None,
+        expected_returns: Optional[np.ndarray] = None
+    ) -> CorrelatedHoldingModel:
+        """
+        Correlated holding-level model for the current portfolio.
+
+        Models are cached per holdings/covariance/returns combination so the
+        covariance factor is computed once and reused across simulations.
+        """
+        return self._holding_model_with_key(covariance, expected_returns)[1]
+
+    def holding_monte_carlo(
+        self,
+        covariance: Optional[np.ndarray] = None,
+        expected_returns: Optional[np.ndarray] = None,
+        num_simulations: int = 1000,
+        time_horizon: int = 252,
+        seed: Optional[int] = None,
+        use_float32: bool = False,
+        streaming: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        num_workers: int = 1
+    ) -> Dict:
+        """
+        Run a correlated Monte Carlo simulation over the individual holdings.
+
+        Args:
+            covariance: Annualized (num_assets, num_assets) covariance matrix in
+                the order of ``portfolio.assets``; defaults to ``default_covariance``
+            expected_returns: Annualized expected return per holding; defaults to
+                the asset class assumptions
+            num_simulations: Number of simulated paths
+            time_horizon: Number of trading days per path
+            seed: Seed for the ``np.random.Generator``; defaults to the analyzer seed
+            use_float32: Simulate in float32
+            streaming: Keep only running statistics instead of the paths
+            chunk_size: Paths per batch in streaming mode
+            num_workers: Processes to split the simulation across (implies streaming)
+
+        Returns:
+            Same layout as ``monte_carlo_simulation`` (or ``streaming_monte_carlo``
+            when ``streaming`` is set)
+        """
+        model_key, model = self._holding_model_with_key(covariance, expected_returns)
+
+        return self._run_simulation(
+            partial(model.simulate_paths, dtype=np.float32 if use_float32 else np.float64),
+            float(model.initial_values.sum()),
+            model.portfolio_parameters(),
+            num_simulations,
+            time_horizon,
+            seed,
+            streaming,
+            chunk_size,
+            num_workers,
+            model_key=('holding', model_key, use_float32)
+        )
+
+    def stress_test(
+        self,
+        shocks: Optional[np.ndarray] = None,
+        months: int = 12,
+        noise_std: float = 0.0,
+        num_paths: int = 1,
+        seed: Optional[int] = None,
+        **axes
+    ) -> Dict:
+        """
+        Evaluate the current holdings under a grid of factor shocks.
+
+        Args:
+            shocks: (num_scenarios, 4) shocks in ``STRESS_FACTORS`` order; or
+                pass per-factor axes (``rates=..., equity=...``) to use
+                ``shock_grid``
+            months: Months over which the shock is phased in
+            noise_std: Monthly noise in percent (0 for deterministic paths)
+            num_paths: Noise paths per scenario
+            seed: Seed for the noise; defaults to the analyzer seed
+
+        Returns:
+            The ``stress_grid`` arrays (plus ``shocks`` and ``factors``) and a
+            ``summary`` of the impact distribution. Results are cached.
+        """
+        if shocks is None:
+            shocks = shock_grid(**axes)
+        shocks = np.atleast_2d(np.asarray(shocks, dtype=np.float64))
+        portfolio_data, portfolio_key = self._portfolio_state()
+        seed = self.seed if seed is None else seed
+
+        key = make_cache_key('stress_test', portfolio_key, shocks, months, noise_std, num_paths, seed)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        assets = self.portfolio_manager.portfolio.assets
+        result = stress_grid(
+            shocks, stress_sensitivities(assets), assets.allocation / 100, portfolio_data['total_value'],
+            months=months, noise_std=noise_std, num_paths=num_paths, rng=np.random.default_rng(seed)
+        )
+        result['shocks'] = shocks
+        result['factors'] = list(STRESS_FACTORS)
+        result['summary'] = summarize_stress(shocks, result['impact'])
+        return self.cache.put(key, result)
+
+    def _window_returns(self, store: PriceStore, symbols: List[str], start, end) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-window return matrix, cached until the store grows or the holdings change"""
+        key = make_cache_key('window_returns', os.path.abspath(store.root), len(store), symbols, start, end)
+        cached = self.cache.get(key)
+        if cached is None:
+            cached = self.cache.put(key, window_returns(store, symbols, start, end))
+        return cached
+
+    def historical_replay(
+        self,
+        windows: Optional[Dict[str, Tuple[str, str, str]]] = None,
+        price_store: Optional[PriceStore] = None,
+        weights: Optional[np.ndarray] = None
+    ) -> Dict:
+        """
+        Replay historical episodes against the current holdings.
+
+        Args:
+            windows: Name -> (start, end, description); defaults to HISTORICAL_WINDOWS
+            price_store: Source of daily closes; defaults to the local store at
+                ``price_store.DEFAULT_ROOT``
+            weights: Optional (num_portfolios, num_holdings) weight matrix
+                (fractions, holdings in portfolio order) to replay many
+                portfolios over the same holdings in one pass
+
+        Returns:
+            Per window: the P&L path, total return, max drawdown and worst day
+            of the current portfolio, or arrays with one entry per row of
+            ``weights`` when it is given. Empty when no ``price_store`` is given
+            and the local store has not been created yet
+        """
+        windows = HISTORICAL_WINDOWS if windows is None else windows
+        store = price_store
+        if store is None:
+            try:
+                store = PriceStore(read_only=True)
+            except FileNotFoundError:
+                # Fresh checkout: no closes have been downloaded, so there is nothing to replay
+                return {}
+        portfolio_data, _ = self._portfolio_state()
+        initial_value = portfolio_data['total_value']
+
+        assets = self.portfolio_manager.portfolio.assets
+        symbols = assets.symbol.tolist()
+        batch = weights is not None
+        if not batch:
+            weights = assets.allocation / assets.allocation.sum()
+        weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+        has_history = np.array([symbol in store for symbol in symbols])
+
+        results = {}
+        for name, (start, end, description) in windows.items():
+            dates, returns = self._window_returns(store, symbols, start, end)
+            replay = replay_returns(weights, returns)
+            worst_dates = dates[replay['worst_day_index']].astype(str) if len(dates) else None
+            coverage = weights[:, has_history].sum(axis=1) / weights.sum(axis=1)
+
+            if batch:
+                results[name] = {
+                    'name': description,
+                    'start': start,
+                    'end': end,
+                    'days': len(dates),
+                    'coverage': coverage,
+                    'total_return_percent': replay['total_return'] * 100,
+                    'max_drawdown_percent': replay['max_drawdown'] * 100,
+                    'recovery_days': replay['recovery_days'],
+                    'worst_day_return_percent': replay['worst_day_return'] * 100,
+                    'worst_day': worst_dates
+                }
+                continue
+
+            results[name] = {
+                'name': description,
+                'start': start,
+                'end': end,
+                'days': len(dates),
+                'coverage': float(coverage[0]),
+                'pnl': ((replay['paths'][0] - 1) * initial_value).tolist(),
+                'dates': [start] + dates.astype(str).tolist(),
+                'final_value': float(replay['paths'][0, -1] * initial_value),
+                'total_return_percent': float(replay['total_return'][0] * 100),
+                'max_drawdown_percent': float(replay['max_drawdown'][0] * 100),
+                'recovery_days': None if np.isnan(replay['recovery_days'][0]) else float(replay['recovery_days'][0]),
+                'worst_day': {
+                    'date': None if worst_dates is None else worst_dates[0],
+                    'return_percent': float(replay['worst_day_return'][0] * 100)
+                }
+            }
+
+        return results
+
+    def interest_rate_scenarios(self, seed: Optional[int] = None) -> Dict:
         """Analyze portfolio under different interest rate scenarios"""
-        portfolio_data = self.portfolio_manager.to_dict()
+        portfolio_data, _ = self._portfolio_state()
         initial_value = portfolio_data['total_value']
         
         scenarios = {
@@ -80,44 +928,22 @@ class ScenarioAnalyzer:
             'rate_hike': {'rate_change': 2.0, 'name': 'Rate Hike (+2%)'}
         }
         
-        # Impact factors for different asset classes
-        rate_sensitivity = {
-            'stock': -0.5,  # Stocks benefit from lower rates
-            'bond': -2.0,   # Bonds are very sensitive to rates
-            'crypto': -1.0, # Crypto benefits from lower rates
-            'cash': 1.0     # Cash benefits from higher rates
-        }
+        # Gradual impact over 12 months with 2% monthly noise (fresh each call
+        # unless a seed is given)
+        assets = self.portfolio_manager.portfolio.assets
+        grid = stress_grid(
+            shock_grid(rates=[s['rate_change'] for s in scenarios.values()]),
+            stress_sensitivities(assets), assets.allocation / 100, initial_value,
+            months=12, noise_std=0.02, rng=np.random.default_rng(seed)
+        )
         
         scenario_results = {}
-        
-        for scenario_key, scenario in scenarios.items():
-            rate_change = scenario['rate_change']
-            portfolio_impact = 0
-            
-            # Calculate impact on each asset class
-            for asset_type, allocation in portfolio_data['asset_allocation'].items():
-                if asset_type in rate_sensitivity:
-                    # Impact = rate_change * sensitivity * allocation_weight
-                    impact = rate_change * rate_sensitivity[asset_type] * (allocation / 100)
-                    portfolio_impact += impact
-            
-            # Generate 12-month projection
-            months = list(range(1, 13))
-            monthly_values = []
-            
-            for month in months:
-                # Gradual impact over time with some randomness
-                time_factor = month / 12
-                random_factor = np.random.normal(0, 0.02)  # 2% monthly volatility
-                
-                monthly_return = (portfolio_impact * time_factor + random_factor) / 100
-                monthly_value = initial_value * (1 + monthly_return)
-                monthly_values.append(monthly_value)
-            
+        for i, (scenario_key, scenario) in enumerate(scenarios.items()):
+            monthly_values = grid['monthly_values'][i].tolist()
             scenario_results[scenario_key] = {
                 'name': scenario['name'],
-                'rate_change': rate_change,
-                'portfolio_impact': portfolio_impact,
+                'rate_change': scenario['rate_change'],
+                'portfolio_impact': float(grid['impact'][i]),
                 'monthly_values': monthly_values,
                 'final_value': monthly_values[-1],
                 'total_return': (monthly_values[-1] - initial_value) / initial_value * 100
@@ -125,35 +951,59 @@ class ScenarioAnalyzer:
         
         return scenario_results
     
-    def risk_analysis(self) -> Dict:
-        """Comprehensive risk analysis of the portfolio"""
-        portfolio_data = self.portfolio_manager.to_dict()
-        
-        # Value at Risk (VaR) calculation
-        monte_carlo_results = self.monte_carlo_simulation(num_simulations=10000, time_horizon=21)  # 1 month
-        final_values = monte_carlo_results['final_values']
+    def risk_analysis(
+        self,
+        num_simulations: int = 10000,
+        time_horizon: int = 21,
+        seed: Optional[int] = None,
+        streaming: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        num_workers: int = 1
+    ) -> Dict:
+        """
+        Comprehensive risk analysis of the portfolio.
+
+        Args:
+            num_simulations: Number of Monte Carlo paths
+            time_horizon: Risk horizon in trading days (default 1 month)
+            seed: Seed for the simulation; defaults to the analyzer seed
+            streaming: Use the constant-memory streaming simulation, which
+                allows VaR over millions of paths
+            chunk_size: Paths per batch in streaming mode
+            num_workers: Processes for a parallel streaming simulation (implies
+                streaming); results are reproducible for a fixed seed and worker count
+        """
+        portfolio_data, portfolio_key = self._portfolio_state()
         initial_value = portfolio_data['total_value']
-        
-        # Calculate VaR at different confidence levels
-        var_95 = initial_value - np.percentile(final_values, 5)
-        var_99 = initial_value - np.percentile(final_values, 1)
-        
+        seed = self.seed if seed is None else seed
+        streaming = streaming or num_workers > 1
+
+        key = make_cache_key(
+            'risk_analysis', portfolio_key, num_simulations, time_horizon, seed,
+            streaming, chunk_size, num_workers
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        if streaming:
+            monte_carlo_results = self.streaming_monte_carlo(
+                num_simulations, time_horizon, seed=seed, chunk_size=chunk_size, num_workers=num_workers
+            )
+            drawdown = monte_carlo_results['drawdown']
+        else:
+            monte_carlo_results = self.monte_carlo_simulation(num_simulations, time_horizon, seed=seed)
+            drawdown = drawdown_distribution(monte_carlo_results['simulations'], chunk_size)
+        statistics = monte_carlo_results['statistics']
+
+        # Value at Risk (VaR) at different confidence levels
+        var_95 = initial_value - statistics['percentile_5']
+        var_99 = initial_value - statistics['percentile_1']
+
         # Expected Shortfall (Conditional VaR)
-        var_95_threshold = np.percentile(final_values, 5)
-        expected_shortfall = initial_value - np.mean([val for val in final_values if val <= var_95_threshold])
-        
-        # Maximum Drawdown estimation
-        max_drawdown = 0
-        for simulation in monte_carlo_results['simulations'][:100]:  # Sample 100 simulations
-            peak = simulation[0]
-            for value in simulation:
-                if value > peak:
-                    peak = value
-                drawdown = (peak - value) / peak
-                if drawdown > max_drawdown:
-                    max_drawdown = drawdown
-        
-        return {
+        expected_shortfall = initial_value - statistics['tail_mean_5']
+
+        return self.cache.put(key, {
             'value_at_risk': {
                 'var_95': var_95,
                 'var_99': var_99,
@@ -162,10 +1012,20 @@ class ScenarioAnalyzer:
             },
             'expected_shortfall': expected_shortfall,
             'expected_shortfall_percent': (expected_shortfall / initial_value) * 100,
-            'max_drawdown_estimate': max_drawdown * 100,
+            'max_drawdown_estimate': drawdown['percentile_99'] * 100,
+            'max_drawdown': {
+                'mean_percent': drawdown['mean'] * 100,
+                'median_percent': drawdown['median'] * 100,
+                'percentile_95_percent': drawdown['percentile_95'] * 100,
+                'percentile_99_percent': drawdown['percentile_99'] * 100,
+                'worst_percent': drawdown['worst'] * 100,
+                'probability_of_recovery': drawdown['probability_of_recovery'],
+                'mean_days_to_recovery': drawdown['mean_time_to_recovery'],
+                'median_days_to_recovery': drawdown['median_time_to_recovery']
+            },
             'portfolio_volatility': portfolio_data['metrics']['portfolio_volatility'],
             'sharpe_ratio': portfolio_data['metrics']['sharpe_ratio']
-        }
+        })
 
 if __name__ == "__main__":
     analyzer = ScenarioAnalyzer()
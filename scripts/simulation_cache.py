@@ -0,0 +1,132 @@
+"""
+In-process cache for simulation results.
+
+Results are keyed by a hash of everything that determines them (portfolio
+state, model parameters, horizon, path count, seed, ...) and evicted in
+least-recently-used order once a byte budget is exceeded.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Stable hash of JSON-serializable parts (arrays are hashed by dtype, shape and bytes)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(f"{part.dtype}{part.shape}".encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+
+def result_nbytes(value: Any) -> int:
+    """Approximate memory footprint of a (nested) result, dominated by its arrays"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(result_nbytes(v) for v in value.values()) + 64 * len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(result_nbytes(v) for v in value) + 8 * len(value)
+    return 32
+
+
+def _freeze(value: Any) -> None:
+    """Mark cached arrays read-only so callers cannot corrupt shared results"""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, dict):
+        for v in value.values():
+            _freeze(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _freeze(v)
+
+
+def _copy_containers(value: Any) -> Any:
+    """Copy the dict/list structure of a cached result, sharing its frozen arrays"""
+    if isinstance(value, dict):
+        return {k: _copy_containers(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_containers(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_copy_containers(v) for v in value)
+    return value
+
+
+class SimulationCache:
+    """Thread-safe LRU cache with a total byte-size cap"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_entries: int = 128):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a copy of the cached result for key (marking it most recently used), or None"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = self._entries[key]
+
+        return _copy_containers(value)
+
+    def put(self, key: str, value: Any) -> Any:
+        """Cache a result, evicting least recently used entries to stay within the caps"""
+        size = result_nbytes(value)
+        if size > self.max_bytes:
+            return value
+
+        _freeze(value)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._sizes.pop(key)
+                del self._entries[key]
+
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self.current_bytes -= self._sizes.pop(evicted)
+
+        return _copy_containers(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current occupancy"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+# Shared by every ScenarioAnalyzer in the process unless one is passed explicitly
+default_simulation_cache = SimulationCache()
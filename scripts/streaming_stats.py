@@ -0,0 +1,288 @@
+"""
+Constant-memory statistics for streaming simulations.
+
+Every estimator here is updated chunk by chunk and can be merged with another
+estimator of the same configuration, so simulations can run in fixed-size
+batches (or in separate processes) without keeping the simulated paths.
+"""
+
+from typing import Any, Dict
+
+import numpy as np
+
+
+class RunningMoments:
+    """Running count, mean and variance (Welford/Chan batch updates)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values: np.ndarray) -> None:
+        """Fold a batch of observations into the running moments"""
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+
+        batch = RunningMoments()
+        batch.count = values.size
+        batch.mean = float(values.mean())
+        batch.m2 = float(np.square(values - batch.mean).sum())
+        self.merge(batch)
+
+    def merge(self, other: "RunningMoments") -> None:
+        """Combine with moments accumulated over a disjoint set of observations"""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def variance(self) -> float:
+        """Population variance, matching ``np.var``"""
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+
+class QuantileSketch:
+    """
+    Mergeable fixed-grid histogram for quantiles and tail means.
+
+    Values are binned on a uniform grid over ``[lower, upper]``; values outside
+    the grid land in the edge bins while the exact min/max are tracked. Each
+    bin also keeps the sum of its values, so the mean of the lower tail
+    (expected shortfall) is exact up to the single bin containing the cut-off.
+    Two sketches with the same grid merge by adding their arrays.
+    """
+
+    def __init__(self, lower: float, upper: float, num_bins: int = 8192):
+        if not upper > lower:
+            raise ValueError("QuantileSketch requires upper > lower")
+
+        self.lower = float(lower)
+        self.upper = float(upper)
+        self.num_bins = num_bins
+        self.bin_width = (self.upper - self.lower) / num_bins
+        self.counts = np.zeros(num_bins, dtype=np.int64)
+        self.sums = np.zeros(num_bins, dtype=np.float64)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def update(self, values: np.ndarray) -> None:
+        """Add a batch of observations"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+
+        bins = np.floor((values - self.lower) / self.bin_width)
+        bins = np.clip(bins, 0, self.num_bins - 1).astype(np.intp)
+
+        self.counts += np.bincount(bins, minlength=self.num_bins)
+        self.sums += np.bincount(bins, weights=values, minlength=self.num_bins)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Add the observations of a sketch built on the same grid"""
+        if (other.lower, other.upper, other.num_bins) != (self.lower, self.upper, self.num_bins):
+            raise ValueError("Cannot merge sketches with different grids")
+
+        self.counts += other.counts
+        self.sums += other.sums
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _locate(self, q: float):
+        """Bin index, rank inside that bin and cumulative count below it for quantile q"""
+        cumulative = np.cumsum(self.counts)
+        total = cumulative[-1]
+        if total == 0:
+            raise ValueError("QuantileSketch is empty")
+
+        target = min(max(q, 0.0), 1.0) * total
+        index = min(int(np.searchsorted(cumulative, target, side="left")), self.num_bins - 1)
+        below = cumulative[index - 1] if index > 0 else 0
+        return index, target - below, below, target
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile (0 <= q <= 1) by interpolating inside its bin"""
+        index, rank, _, _ = self._locate(q)
+
+        low = self.lower + index * self.bin_width
+        high = low + self.bin_width
+        if index == 0:
+            low = min(low, self.min)
+        if index == self.num_bins - 1:
+            high = max(high, self.max)
+
+        fraction = rank / self.counts[index] if self.counts[index] else 0.0
+        return float(np.clip(low + fraction * (high - low), self.min, self.max))
+
+    def tail_mean(self, q: float) -> float:
+        """Mean of the observations at or below the q-quantile"""
+        index, rank, below, target = self._locate(q)
+        if target == 0:
+            return self.min
+
+        tail_sum = self.sums[:index].sum()
+        if self.counts[index]:
+            tail_sum += rank * self.sums[index] / self.counts[index]
+        return float(tail_sum / (below + rank))
+
+
+def path_drawdowns(paths: np.ndarray):
+    """
+    Maximum drawdown and time to recovery for every path.
+
+    Uses a running peak (``np.maximum.accumulate`` along the time axis), so the
+    whole block is processed without a Python loop over paths or days.
+
+    Returns:
+        Tuple of (max_drawdown, recovery_days) arrays, one entry per path.
+        ``max_drawdown`` is a fraction of the running peak; ``recovery_days`` is
+        the number of steps from the deepest trough back to the preceding
+        peak, 0 for paths without a drawdown and NaN for paths that never recover.
+    """
+    paths = np.asarray(paths, dtype=np.float64)
+    rows = np.arange(paths.shape[0])
+    steps = np.arange(paths.shape[1])
+
+    running_peak = np.maximum.accumulate(paths, axis=1)
+    drawdowns = 1 - paths / running_peak
+
+    trough = drawdowns.argmax(axis=1)
+    max_drawdown = drawdowns[rows, trough]
+
+    recovered = (paths >= running_peak[rows, trough][:, None]) & (steps > trough[:, None])
+    first_recovery = recovered.argmax(axis=1)
+    recovery_days = np.where(recovered[rows, first_recovery], first_recovery - trough, np.nan)
+    recovery_days[max_drawdown <= 0] = 0
+
+    return max_drawdown, recovery_days
+
+
+def summarize_drawdowns(max_drawdown: np.ndarray, recovery_days: np.ndarray) -> Dict[str, Any]:
+    """Exact drawdown distribution of in-memory per-path results"""
+    recovered = recovery_days[~np.isnan(recovery_days)]
+
+    return {
+        'mean': float(np.mean(max_drawdown)),
+        'median': float(np.median(max_drawdown)),
+        'percentile_95': float(np.percentile(max_drawdown, 95)),
+        'percentile_99': float(np.percentile(max_drawdown, 99)),
+        'worst': float(np.max(max_drawdown)),
+        'probability_of_recovery': len(recovered) / len(recovery_days),
+        'mean_time_to_recovery': float(np.mean(recovered)) if len(recovered) else None,
+        'median_time_to_recovery': float(np.median(recovered)) if len(recovered) else None
+    }
+
+
+class MonteCarloAccumulator:
+    """
+    Running summary of simulated portfolio paths.
+
+    Tracks the moments, probability of loss and a quantile sketch of final
+    values so percentiles, VaR and expected shortfall can be reported without
+    keeping any paths, plus the distribution of per-path maximum drawdown and
+    time to recovery. Accumulators built with the same arguments can be merged.
+    """
+
+    def __init__(
+        self,
+        initial_value: float,
+        lower: float,
+        upper: float,
+        time_horizon: int,
+        num_bins: int = 8192
+    ):
+        self.initial_value = initial_value
+        self.moments = RunningMoments()
+        self.sketch = QuantileSketch(lower, upper, num_bins)
+        self.loss_count = 0
+
+        self.drawdown_moments = RunningMoments()
+        self.drawdown_sketch = QuantileSketch(0.0, 1.0, num_bins)
+        self.recovery_moments = RunningMoments()
+        # One bin per whole day of recovery time
+        self.recovery_sketch = QuantileSketch(-0.5, time_horizon + 0.5, time_horizon + 1)
+
+    @property
+    def count(self) -> int:
+        return self.moments.count
+
+    def update(self, paths: np.ndarray) -> None:
+        """Fold a (num_paths, time_horizon + 1) chunk of simulated paths"""
+        final_values = paths[:, -1].astype(np.float64)
+
+        self.moments.update(final_values)
+        self.sketch.update(final_values)
+        self.loss_count += int(np.count_nonzero(final_values < self.initial_value))
+
+        max_drawdown, recovery_days = path_drawdowns(paths)
+        recovery_days = recovery_days[~np.isnan(recovery_days)]
+
+        self.drawdown_moments.update(max_drawdown)
+        self.drawdown_sketch.update(max_drawdown)
+        self.recovery_moments.update(recovery_days)
+        self.recovery_sketch.update(recovery_days)
+
+    def merge(self, other: "MonteCarloAccumulator") -> None:
+        """Combine with an accumulator built from an independent set of paths"""
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.loss_count += other.loss_count
+
+        self.drawdown_moments.merge(other.drawdown_moments)
+        self.drawdown_sketch.merge(other.drawdown_sketch)
+        self.recovery_moments.merge(other.recovery_moments)
+        self.recovery_sketch.merge(other.recovery_sketch)
+
+    def statistics(self) -> Dict[str, Any]:
+        """Summary statistics in the same layout as ``monte_carlo_simulation``"""
+        initial_value = self.initial_value
+        mean_final_value = self.moments.mean
+
+        return {
+            'mean_final_value': mean_final_value,
+            'median_final_value': self.sketch.quantile(0.50),
+            'std_final_value': self.moments.std,
+            'percentile_1': self.sketch.quantile(0.01),
+            'percentile_5': self.sketch.quantile(0.05),
+            'percentile_95': self.sketch.quantile(0.95),
+            'tail_mean_1': self.sketch.tail_mean(0.01),
+            'tail_mean_5': self.sketch.tail_mean(0.05),
+            'probability_of_loss': self.loss_count / self.count if self.count else 0.0,
+            'expected_return': (mean_final_value - initial_value) / initial_value,
+            'initial_value': initial_value,
+            'num_simulations': self.count
+        }
+
+    def drawdown_statistics(self) -> Dict[str, Any]:
+        """Drawdown distribution in the same layout as ``summarize_drawdowns``"""
+        recovered = self.recovery_moments.count
+
+        return {
+            'mean': self.drawdown_moments.mean,
+            'median': self.drawdown_sketch.quantile(0.50),
+            'percentile_95': self.drawdown_sketch.quantile(0.95),
+            'percentile_99': self.drawdown_sketch.quantile(0.99),
+            'worst': self.drawdown_sketch.max,
+            'probability_of_recovery': recovered / self.count if self.count else 0.0,
+            'mean_time_to_recovery': self.recovery_moments.mean if recovered else None,
+            'median_time_to_recovery': self.recovery_sketch.quantile(0.50) if recovered else None
+        }